@@ -0,0 +1,95 @@
+"""Check that the cold start of the cli stays within its budget
+
+Every command is started in a fresh interpreter, the best of a few runs is
+compared against the budget and the heavy libraries must not be loaded. The
+influx command fetches an hour of one-minute points from a stand-in (see
+influx_standin.py), so the budget covers the imports of a real fetch while the
+data itself is too small to matter.
+
+Usage: python benchmarks/import_time.py [budget in milliseconds]
+"""
+from __future__ import print_function
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import influx_standin
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+BUDGET_MS = 300
+RUNS = 5
+HEAVY_MODULES = ["matplotlib", "pandas", "sklearn", "fbprophet", "luminol", "scipy"]
+
+# Print the heavy modules loaded after running the command
+CHECK = """
+import sys
+sys.argv = ['kube-learn'] + %r
+try:
+    %s
+except SystemExit:
+    pass
+sys.stdout.write('\\nLOADED:' + ','.join(m for m in %r if m in sys.modules))
+"""
+
+COMMANDS = [
+    ("kube-learn --help", ["--help"], "from kube_learn.cli import main; main()"),
+    ("kube-learn fetch --help", ["fetch", "--help"], "from kube_learn.cli import main; main()"),
+    ("import kube_learn.influx_fetcher", [], "import kube_learn.influx_fetcher"),
+    ("kube-learn influx (stand-in)", ["influx", "{config}", "--port", "{port}"],
+     "from kube_learn.cli import main; main()"),
+]
+
+# Query config of the influx command
+FETCH_CONFIG = {
+    'metrics': [{'name': 'node_cpu_norm', 'flags': {'group': ['instance']}}],
+    'times': {'startTime': '1530000000s', 'stopTime': '1530003600s'},
+    'groupTime': '60s'
+}
+
+
+def run(argv, statement):
+    code = CHECK % (argv, statement, HEAVY_MODULES)
+    start = time.time()
+    output = subprocess.check_output([sys.executable, "-c", code], cwd=ROOT)
+    elapsed = (time.time() - start) * 1000
+    loaded = output.decode().rsplit("LOADED:", 1)[1].strip()
+    return elapsed, [name for name in loaded.split(",") if name]
+
+
+def main(budget=BUDGET_MS):
+    process, port = influx_standin.start_process(series=10)
+    config = tempfile.NamedTemporaryFile("w", suffix=".json", delete=False)
+    json.dump(FETCH_CONFIG, config)
+    config.close()
+    try:
+        return check(budget, {'config': config.name, 'port': str(port)})
+    finally:
+        process.terminate()
+        os.remove(config.name)
+
+
+def check(budget, values):
+    failed = False
+    for name, argv, statement in COMMANDS:
+        argv = [argument.format(**values) for argument in argv]
+        timings = []
+        for _ in range(RUNS):
+            elapsed, loaded = run(argv, statement)
+            timings.append(elapsed)
+        best = min(timings)
+        status = "ok"
+        if best > budget:
+            status = "OVER BUDGET"
+            failed = True
+        if loaded:
+            status = "loads " + ", ".join(loaded)
+            failed = True
+        print("%-36s %7.1f ms  %s" % (name, best, status))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(*[float(arg) for arg in sys.argv[1:2]]))
@@ -0,0 +1,199 @@
+"""Local stand-in for the InfluxDB HTTP API
+
+Answers the InfluxQL statements generated by kube_learn.influx_fetcher with
+synthetic series, one per instance tag, at the GROUP BY time resolution.
+The value of a series at a time only depends on the series, the time and the
+seed, so sharded, batched and repeated queries see the same data. Points are
+left out at random with probability gaps, like a sparse series in InfluxDB.
+
+Usage: python benchmarks/influx_standin.py [port] [series] [gaps]
+"""
+from __future__ import print_function
+import json
+import math
+import multiprocessing
+import re
+import sys
+import threading
+import time
+
+import numpy as np
+
+try:
+    from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+    from SocketServer import ThreadingMixIn
+    from urlparse import urlparse, parse_qs
+except ImportError:
+    from http.server import HTTPServer, BaseHTTPRequestHandler
+    from socketserver import ThreadingMixIn
+    from urllib.parse import urlparse, parse_qs
+
+DURATION_UNITS = {'u': 1e-6, 'us': 1e-6, 'ms': 1e-3, 's': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800}
+
+
+def parse_duration(duration):
+    """Returns the duration as seconds"""
+    match = re.match(r"(\d+)(us|ms|u|s|m|h|d|w)$", duration.strip())
+    return int(match.group(1)) * DURATION_UNITS[match.group(2)]
+
+
+def parse_time(time_string, now):
+    """Returns the time of a WHERE clause as seconds, bare integers are
+    nanoseconds"""
+    time_string = time_string.strip()
+    match = re.match(r"now\(\)\s*(?:([+-])\s*(\w+))?$", time_string)
+    if match:
+        if match.group(1) is None:
+            return now
+        offset = parse_duration(match.group(2))
+        return now + offset if match.group(1) == '+' else now - offset
+    if time_string.endswith('s'):
+        return int(time_string[:-1])
+    return int(time_string) // 10 ** 9
+
+
+def noise(times, series, salt):
+    """Deterministic pseudo random numbers in [0, 1) for every time"""
+    value = np.sin(times * 12.9898 + series * 78.233 + salt * 37.719) * 43758.5453
+    return value - np.floor(value)
+
+
+class Generator(object):
+    """Synthetic series: a daily cycle per series with noise and rare spikes"""
+
+    def __init__(self, series=10, gaps=0.0, seed=0):
+        self.series = series
+        self.gaps = gaps
+        self.seed = seed
+
+    def values(self, times, series):
+        cycle = np.sin(2 * math.pi * times / 86400.0 + series) * (series + 1)
+        jitter = noise(times, series, self.seed) - 0.5
+        spikes = (noise(times, series, self.seed + 1) > 0.999) * 10.0 * (series + 1)
+        return 50 + cycle + jitter + spikes
+
+    def series_points(self, start, stop, step, series):
+        """Returns the times and values of one series between start and stop"""
+        times = np.arange(start - start % step, stop + 1, step, dtype=np.int64)
+        times = times[times >= start]
+        if self.gaps > 0:
+            times = times[noise(times, series, self.seed + 2) >= self.gaps]
+        return times, self.values(times.astype(np.float64), series)
+
+    def query(self, statement, now=None):
+        """Returns the result of one statement in the shape of the HTTP API"""
+        if now is None:
+            now = int(time.time())
+
+        if statement.startswith("SELECT min("):
+            inner = self.query(statement[statement.index("FROM (") + 6:-1], now)
+            values = [value for series in inner.get('series', []) for _, value in series['values']]
+            if not values:
+                return {}
+            return {'series': [{'name': '_', 'columns': ['time', 'min_value', 'max_value'],
+                                'values': [[0, min(values), max(values)]]}]}
+
+        start = re.search(r"time >= (now\(\)[^)]*|[^)]+)\)", statement)
+        stop = re.search(r"time <= (now\(\)[^)]*|[^)]+)\)", statement)
+        start = parse_time(start.group(1), now) if start else now - 3600
+        stop = parse_time(stop.group(1), now) if stop else now
+        step = int(parse_duration(re.search(r"GROUP BY time\((\w+)\)", statement).group(1)))
+
+        smooth = re.search(r"moving_average\(.*, (\d+)\) AS", statement)
+        rate = "derivative(" in statement
+
+        series = []
+        for number in range(self.series):
+            times, values = self.series_points(start, stop, step, number)
+            if rate:
+                values = np.diff(values)
+                times = times[1:]
+                if "non_negative_derivative(" in statement:
+                    keep = values >= 0
+                    times, values = times[keep], values[keep]
+            if smooth:
+                level = int(smooth.group(1))
+                if len(values) < level:
+                    continue
+                values = np.convolve(values, np.ones(level) / level, 'valid')
+                times = times[level - 1:]
+            if len(times) == 0:
+                continue
+            series.append({'name': '_', 'tags': {'instance': 'node%d' % number},
+                           'columns': ['time', 'data_value'],
+                           'values': list(zip(times.tolist(), values.tolist()))})
+
+        if not series:
+            return {}
+        return {'series': series}
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        params = parse_qs(urlparse(self.path).query)
+        if self.command == 'POST':
+            length = int(self.headers.get('Content-Length') or 0)
+            params.update(parse_qs(self.rfile.read(length).decode()))
+
+        results = []
+        if 'q' in params:
+            for statement_id, statement in enumerate(params['q'][0].split("; ")):
+                result = self.server.generator.query(statement)
+                result['statement_id'] = statement_id
+                results.append(result)
+
+        body = json.dumps({'results': results}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_POST = do_GET
+
+    def log_message(self, *args):
+        pass
+
+
+class StandinServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, generator):
+        HTTPServer.__init__(self, address, StandinHandler)
+        self.generator = generator
+
+
+def start(port=0, series=10, gaps=0.0, seed=0):
+    """Starts a stand-in on a background thread and returns the server, the
+    port it listens on is server.server_port"""
+    server = StandinServer(('127.0.0.1', port), Generator(series, gaps, seed))
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server
+
+
+def serve(port=8086, series=10, gaps=0.0, seed=0, connection=None):
+    """Runs a stand-in in the foreground, the port is sent to connection if
+    it is set"""
+    server = StandinServer(('127.0.0.1', port), Generator(series, gaps, seed))
+    if connection is not None:
+        connection.send(server.server_port)
+    else:
+        print("Serving %d series on port %d" % (series, server.server_port))
+    server.serve_forever()
+
+
+def start_process(series=10, gaps=0.0, seed=0):
+    """Starts a stand-in in its own process, so serving doesn't compete with
+    the benchmark for the GIL. Returns the process and the port"""
+    receiver, sender = multiprocessing.Pipe(False)
+    process = multiprocessing.Process(target=serve, args=(0, series, gaps, seed, sender))
+    process.daemon = True
+    process.start()
+    return process, receiver.recv()
+
+
+if __name__ == '__main__':
+    types = [int, int, float]
+    serve(*[convert(argument) for convert, argument in zip(types, sys.argv[1:])])
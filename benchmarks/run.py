@@ -0,0 +1,310 @@
+"""Benchmarks of the fetch and detection pipeline against a local stand-in
+
+Every scenario starts a stand-in (see influx_standin.py) serving its number
+of series and gap density, fetches its points with get_metrics and runs the
+luminol and Prophet detectors on the first series. Each scenario runs in its
+own process so the peak memory of one doesn't hide the next. The results are
+appended to a JSON lines file, --compare prints the change between runs.
+
+Usage: python benchmarks/run.py [scenario ...] [--points N --series N --gaps F]
+       python benchmarks/run.py --compare [run] [baseline run]
+"""
+from __future__ import absolute_import, print_function
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import timedelta
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+import influx_standin
+
+RESULTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results.jsonl")
+START_TIME = 1530000000
+STEP = 60
+
+# points is the total over all series, detect_points limits the points the
+# detectors get per series, they are far slower than fetching
+SCENARIOS = {
+    'small': {'points': 1000, 'series': 1, 'gaps': 0.0},
+    'medium': {'points': 100000, 'series': 10, 'gaps': 0.01},
+    'wide': {'points': 100000, 'series': 500, 'gaps': 0.0},
+    'sparse': {'points': 100000, 'series': 50, 'gaps': 0.5},
+    'large': {'points': 10000000, 'series': 100, 'gaps': 0.01, 'detect_points': 20000},
+    'huge': {'points': 10000000, 'series': 1, 'gaps': 0.0, 'detect_points': 20000},
+}
+DEFAULT_SCENARIOS = ['small', 'medium', 'wide', 'sparse']
+
+# Functions of the Prophet detector timed as stages, stages include the time
+# of the stages they call
+PROPHET_STAGES = ['generate_holidays', 'build_model', 'build_future', 'get_prediction', 'get_std_dev',
+                  'fill_std_dev_forecast', 'get_residual', 'get_anomalies']
+
+
+def peak_rss():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+@contextmanager
+def quiet():
+    """Hides the progress output of the code under test"""
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, "w")
+    try:
+        yield
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+
+
+@contextmanager
+def measure(stages, name, points):
+    """Records seconds, throughput and memory of a stage in stages"""
+    rss = peak_rss()
+    start = time.time()
+    entry = {'points': points}
+    try:
+        yield entry
+    finally:
+        entry['seconds'] = time.time() - start
+        entry['points_per_second'] = entry['points'] / entry['seconds'] if entry['seconds'] > 0 else None
+        entry['peak_rss_kb'] = peak_rss()
+        entry['rss_growth_kb'] = entry['peak_rss_kb'] - rss
+        stages[name] = entry
+
+
+@contextmanager
+def timed_functions(obj, names, report):
+    """Temporarily wraps the functions names of obj so their calls are added
+    to report as stages"""
+    def wrap(stage, original):
+        def wrapper(*args, **kwargs):
+            with report.measure(stage):
+                return original(*args, **kwargs)
+        return wrapper
+
+    originals = {}
+    for name in names:
+        if name not in vars(obj):
+            continue
+        originals[name] = vars(obj)[name]
+        setattr(obj, name, wrap(name, originals[name]))
+    try:
+        yield
+    finally:
+        for name, original in originals.items():
+            setattr(obj, name, original)
+
+
+def query_configs(scenario):
+    rows = max(scenario['points'] // scenario['series'], 2)
+    return {
+        'metrics': [{'name': 'bench', 'flags': {'group': ['instance']}}],
+        'times': {
+            'startTime': "%ds" % START_TIME,
+            'stopTime': "%ds" % (START_TIME + rows * STEP - 1)
+        },
+        'groupTime': "%ds" % STEP
+    }
+
+
+def run_fetch(scenario, port, stages):
+    from kube_learn import influx_fetcher
+
+    influx_config = influx_fetcher.InfluxConfig("127.0.0.1", port, "bench", "bench", "bench",
+                                                concurrency=scenario['concurrency'])
+    report = influx_fetcher.FetchReport()
+    with measure(stages, 'get_metrics', 0) as entry:
+        with quiet():
+            result = influx_fetcher.get_metrics(query_configs(scenario), influx_config, columnar=True,
+                                                report=report)
+        entry['points'] = sum(report.points.values())
+    entry['stages'] = report.finish().to_dict()['stages']
+    entry['bytes_received'] = report.bytes_received
+    return result
+
+
+def run_luminol(scenario, result, stages):
+    try:
+        from kube_learn import luminol_detector
+    except ImportError as error:
+        stages['find_anomalies'] = {'skipped': str(error)}
+        return
+
+    columns = result['data'][-scenario['detect_points']:, :scenario['detect_series']]
+    with measure(stages, 'find_anomalies', columns.size) as entry:
+        with quiet():
+            entry['anomalies'] = sum(len(luminol_detector.find_anomalies(column)) for column in columns.T)
+
+
+def run_prophet(scenario, result, stages):
+    os.environ.setdefault('MPLBACKEND', 'Agg')
+    try:
+        import pandas as pd
+        from kube_learn import influx_fetcher, prophet_anomaly_detector
+    except ImportError as error:
+        stages['calculate_anomalies'] = {'skipped': str(error)}
+        return
+
+    times = pd.to_datetime(result['times'][-scenario['detect_points']:], unit='s')
+    columns = result['data'][-scenario['detect_points']:, :scenario['detect_series']]
+    report = influx_fetcher.FetchReport()
+    with measure(stages, 'calculate_anomalies', columns.size) as entry:
+        with quiet(), timed_functions(prophet_anomaly_detector, PROPHET_STAGES, report), \
+                timed_functions(prophet_anomaly_detector.Prophet, ['fit'], report):
+            for column in columns.T:
+                data = pd.DataFrame({'ds': times, 'y': column}, index=times)
+                prophet_anomaly_detector.calculate_anomalies(data, window_delta=timedelta(hours=4), plot=False)
+    entry['stages'] = report.finish().to_dict()['stages']
+
+
+def run_scenario(scenario, connection):
+    """Runs all stages of a scenario, meant to run in its own process"""
+    process, port = influx_standin.start_process(scenario['series'], scenario['gaps'], scenario['seed'])
+    stages = {}
+    try:
+        result = run_fetch(scenario, port, stages)
+        if 'luminol' in scenario['detectors']:
+            run_luminol(scenario, result, stages)
+        if 'prophet' in scenario['detectors']:
+            run_prophet(scenario, result, stages)
+    except Exception as error:
+        stages['error'] = {'skipped': "%s: %s" % (type(error).__name__, error)}
+    finally:
+        process.terminate()
+    connection.send(stages)
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def format_stage(name, entry):
+    if 'skipped' in entry:
+        return "  %-22s skipped (%s)" % (name, entry['skipped'])
+    rate = entry['points_per_second'] or 0
+    return "  %-22s %9.3f s %14.0f points/s %10d kB peak" % (name, entry['seconds'], rate, entry['peak_rss_kb'])
+
+
+def run(names, scenarios, results_path):
+    run_id = uuid.uuid4().hex[:8]
+    print("Run %s" % run_id)
+    for name in names:
+        scenario = scenarios[name]
+        receiver, sender = multiprocessing.Pipe(False)
+        process = multiprocessing.Process(target=run_scenario, args=(scenario, sender))
+        process.start()
+        sender.close()
+        try:
+            stages = receiver.recv()
+        except EOFError:
+            stages = {'error': {'skipped': "exited with %s" % process.exitcode}}
+        process.join()
+
+        print("%s: %d points, %d series, %g gaps" % (name, scenario['points'], scenario['series'], scenario['gaps']))
+        for stage, entry in sorted(stages.items()):
+            print(format_stage(stage, entry))
+
+        record = {
+            'run': run_id,
+            'started': time.time(),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'name': name,
+            'scenario': scenario,
+            'stages': stages
+        }
+        with open(results_path, "a") as file_handle:
+            file_handle.write(json.dumps(record) + "\n")
+    print("Results appended to " + results_path)
+    return 0
+
+
+def compare(results_path, run_id=None, baseline_id=None):
+    """Prints the seconds of every stage of run_id next to baseline_id, the
+    last two runs by default"""
+    records = []
+    with open(results_path) as file_handle:
+        for line in file_handle:
+            records.append(json.loads(line))
+
+    run_ids = []
+    for record in records:
+        if record['run'] not in run_ids:
+            run_ids.append(record['run'])
+    if run_id is None:
+        run_id = run_ids[-1]
+    if baseline_id is None:
+        older = run_ids[:run_ids.index(run_id)]
+        if not older:
+            print("No run before " + run_id + " to compare to")
+            return 1
+        baseline_id = older[-1]
+
+    baseline = dict((record['name'], record['stages']) for record in records if record['run'] == baseline_id)
+    print("Run %s against %s" % (run_id, baseline_id))
+    for record in records:
+        if record['run'] != run_id or record['name'] not in baseline:
+            continue
+        print(record['name'] + ":")
+        for stage, entry in sorted(record['stages'].items()):
+            before = baseline[record['name']].get(stage, {})
+            if 'seconds' not in entry or 'seconds' not in before:
+                continue
+            print("  %-22s %9.3f s -> %9.3f s  %6.2fx" % (stage, before['seconds'], entry['seconds'],
+                                                         before['seconds'] / max(entry['seconds'], 1e-9)))
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks of the fetch and detection pipeline")
+    parser.add_argument("scenarios", nargs="*", help="Scenarios to run: " + ", ".join(sorted(SCENARIOS)))
+    parser.add_argument("--points", type=int, help="Run a custom scenario with this many points")
+    parser.add_argument("--series", type=int, default=10, help="Series of the custom scenario")
+    parser.add_argument("--gaps", type=float, default=0.0, help="Share of missing points in the custom scenario")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--detectors", default="luminol,prophet", help="Detectors to run, comma separated")
+    parser.add_argument("--detect-series", type=int, default=1, help="Series the detectors run on")
+    parser.add_argument("--detect-points", type=int, help="Points per series the detectors run on")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--results", default=RESULTS, help="JSON lines file the results are appended to")
+    parser.add_argument("--compare", nargs="*", metavar="RUN", help="Compare a run to a baseline run")
+    args = parser.parse_args(argv)
+
+    if args.compare is not None:
+        return compare(args.results, *args.compare[:2])
+
+    scenarios = dict((name, dict(scenario)) for name, scenario in SCENARIOS.items())
+    names = args.scenarios or ([] if args.points else DEFAULT_SCENARIOS)
+    if args.points:
+        scenarios['custom'] = {'points': args.points, 'series': args.series, 'gaps': args.gaps}
+        names.append('custom')
+    for name in names:
+        if name not in scenarios:
+            parser.error("unknown scenario " + name)
+        scenario = scenarios[name]
+        scenario.setdefault('detect_points', scenario['points'])
+        if args.detect_points:
+            scenario['detect_points'] = args.detect_points
+        scenario['detect_series'] = args.detect_series
+        scenario['detectors'] = args.detectors.split(",")
+        scenario['concurrency'] = args.concurrency
+        scenario['seed'] = args.seed
+
+    return run(names, scenarios, args.results)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
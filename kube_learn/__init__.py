@@ -0,0 +1,5 @@
+"""kube-learn: fetching and anomaly detection for Kubernetes cluster metrics.
+
+Importing the package is cheap, the submodules pull in their own
+dependencies (numpy, pandas, fbprophet, ...) when they are imported.
+"""
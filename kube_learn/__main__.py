@@ -0,0 +1,6 @@
+"""Entry point for python -m kube_learn"""
+from __future__ import absolute_import
+import sys
+from kube_learn.cli import main
+
+sys.exit(main())
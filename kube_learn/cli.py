@@ -0,0 +1,150 @@
+"""Command line interface, every subcommand imports its dependencies lazily
+so listing and fetching don't pay for pandas, matplotlib or fbprophet"""
+from __future__ import absolute_import, print_function
+import argparse
+import json
+import sys
+
+
+def run_fetch(args):
+    from kube_learn import kairos
+    return kairos.fetch(args.ip, args.port, args.output, args.brief, args.regex)
+
+
+def run_parse(args):
+    from kube_learn import kairos
+    return kairos.parse(args.metric, args.infile, args.graph)
+
+
+def run_influx(args):
+    from kube_learn import influx_fetcher
+
+    with open(args.config) as file_handle:
+        query_configs = json.load(file_handle)
+    influx_config = influx_fetcher.InfluxConfig(args.ip, args.port, args.user,
+                                                args.password, args.db,
+                                                concurrency=args.concurrency,
+                                                shard_points=args.shard_points,
+                                                batch_statements=args.batch_statements)
+    cache = influx_fetcher.QueryCache(args.cache) if args.cache else None
+    report = influx_fetcher.FetchReport(args.report) if args.report else None
+
+    result = influx_fetcher.get_metrics(query_configs, influx_config,
+                                        columnar=True, cache=cache,
+                                        report=report)
+    if report is not None:
+        report.finish()
+    if args.output:
+        influx_fetcher.save_metrics(result, args.output, query_configs)
+        print("Wrote results to \"" + args.output + "\"")
+    else:
+        for name in result['feature_names']:
+            print(name)
+    return 0
+
+
+def run_luminol(args):
+    from kube_learn import luminol_detector
+    if args.online or args.follow:
+        luminol_detector.stream(args.config, args.ip, args.follow)
+    else:
+        luminol_detector.main(args.config, args.ip, args.workers, args.variance)
+    return 0
+
+
+def run_prophet(args):
+    from datetime import timedelta
+    import pandas as pd
+    from kube_learn import prophet_anomaly_detector
+
+    # The detector needs the times both as the index and as the ds column
+    raw_data = pd.read_csv(args.data, index_col='ds', parse_dates=['ds'])
+    raw_data['ds'] = raw_data.index
+    filtered_data = []
+    if args.filtered:
+        filtered_data = pd.read_csv(args.filtered, index_col='ds', parse_dates=['ds'])
+        filtered_data['ds'] = filtered_data.index
+    result = prophet_anomaly_detector.calculate_anomalies(
+        raw_data, filtered_data, window_delta=timedelta(hours=args.window),
+        percent_true=args.percent_true, std_dev_smoothing=args.smoothing,
+        plot=args.plot)
+    if not args.plot:
+        result.print_intervals()
+    return 0
+
+
+def run_kmeans(args):
+    from kube_learn import kmeans
+    return kmeans.main(args.input, args.clusters)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="kube-learn")
+    subparsers = parser.add_subparsers(dest="command", metavar="<command>")
+    subparsers.required = True
+
+    fetch = subparsers.add_parser("fetch", help="Fetch the last day of metrics from KairosDB")
+    fetch.add_argument("-i", "--ip", default="127.0.0.1", help="The ip to kairosDB. default: 127.0.0.1")
+    fetch.add_argument("-p", "--port", default="8080", help="The port to kairosDB. default: 8080")
+    fetch.add_argument("-o", "--output", help="File to save serialized result (pickle is used). default: stdout")
+    fetch.add_argument("-r", "--regex", default="", help="Filter output")
+    fetch.add_argument("-b", "--brief", action="store_true", help="Shows only the metric names in the database")
+    fetch.set_defaults(func=run_fetch)
+
+    parse = subparsers.add_parser("parse", help="Print or plot a metric from a fetched file")
+    parse.add_argument("-m", "--metric", required=True, help="The metric to show")
+    parse.add_argument("-i", "--infile", default="", help="File written by fetch. default: stdin")
+    parse.add_argument("-g", "--graph", action="store_true", help="Plot the metric")
+    parse.set_defaults(func=run_parse)
+
+    influx = subparsers.add_parser("influx", help="Fetch aligned metrics from InfluxDB")
+    influx.add_argument("config", help="JSON file with the query configs")
+    influx.add_argument("--ip", default="localhost")
+    influx.add_argument("--port", type=int, default=8086)
+    influx.add_argument("--user", default="prom")
+    influx.add_argument("--password", default="prom")
+    influx.add_argument("--db", default="prometheus")
+    influx.add_argument("--concurrency", type=int, default=1)
+    influx.add_argument("--shard-points", type=int, default=10000,
+                        help="Most groupTime intervals fetched per query, 0 fetches the range in one query")
+    influx.add_argument("--batch-statements", type=int, default=10, help="Most queries sent in one request")
+    influx.add_argument("--cache", help="Directory of the query cache")
+    influx.add_argument("--report", help="Append a timing report to this file")
+    influx.add_argument("-o", "--output", help="File to save the metrics to (see load_metrics)")
+    influx.set_defaults(func=run_influx)
+
+    luminol = subparsers.add_parser("luminol", help="Plot anomalies found by luminol")
+    luminol.add_argument("-c", "--config", default="metrics.json", help="JSON file with the query configs")
+    luminol.add_argument("-i", "--ip", default="212.32.186.86", help="The ip to InfluxDB")
+    luminol.add_argument("-w", "--workers", type=int, default=1, help="Processes to run the detector on")
+    luminol.add_argument("-v", "--variance", type=float, default=0.9,
+                         help="Share of the variance the principal components must explain")
+    luminol.add_argument("--online", action="store_true",
+                         help="Score every feature batch by batch with the online detector and print the anomalies")
+    luminol.add_argument("--follow", action="store_true", help="Like --online, but keep polling for new data")
+    luminol.set_defaults(func=run_luminol)
+
+    prophet = subparsers.add_parser("prophet", help="Plot anomalies found by prophet")
+    prophet.add_argument("data", help="CSV file with the columns ds and y")
+    prophet.add_argument("-f", "--filtered", help="CSV file without the obvious anomalies")
+    prophet.add_argument("-w", "--window", type=float, default=4, help="Anomaly window in hours")
+    prophet.add_argument("--percent-true", type=float, default=1)
+    prophet.add_argument("--smoothing", default="1H", help="Smoothing of the standard deviation")
+    prophet.add_argument("--no-plot", dest="plot", action="store_false", help="Only print the anomalies")
+    prophet.set_defaults(func=run_prophet)
+
+    kmeans = subparsers.add_parser("kmeans", help="Cluster metrics with KMeans")
+    kmeans.add_argument("-i", "--input", default="", help="Pickled samples. default: sample data")
+    kmeans.add_argument("-c", "--clusters", type=int, default=3)
+    kmeans.set_defaults(func=run_kmeans)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
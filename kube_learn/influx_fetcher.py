@@ -0,0 +1,1481 @@
+import sys
+import requests
+from requests.exceptions import ConnectionError
+from contextlib import contextmanager
+from datetime import datetime
+from multiprocessing.pool import ThreadPool
+import numpy as np
+import hashlib
+import json
+import os
+import re
+import resource
+import struct
+import threading
+import time
+
+# Length of the InfluxQL duration units in nanoseconds
+DURATION_UNITS = {
+    'ns': 1,
+    'u': 10 ** 3,
+    'us': 10 ** 3,
+    'ms': 10 ** 6,
+    's': 10 ** 9,
+    'm': 60 * 10 ** 9,
+    'h': 60 * 60 * 10 ** 9,
+    'd': 24 * 60 * 60 * 10 ** 9,
+    'w': 7 * 24 * 60 * 60 * 10 ** 9
+}
+
+# First bytes of files written by save_metrics
+METRICS_FILE_MAGIC = b"KUBELEARN-METRICS\n"
+
+# Alignment of the arrays in files written by save_metrics
+METRICS_FILE_ALIGNMENT = 64
+
+# groupTime intervals every shard also queries past both of its boundaries, fill(linear), derivative and
+# moving_average need the nearest points around a boundary to calculate the values next to it
+SHARD_MARGIN = 60
+
+# Smallest shard_points, so the margins add at most a fifth to the intervals queried
+MIN_SHARD_POINTS = 10 * SHARD_MARGIN
+
+# DB clients that have been created, reused so their HTTP connection pools are shared between calls
+DB_CLIENTS = {}
+
+"""
+    Class to store influxDB configuration, concurrency is the maximum number of requests in flight at once,
+    shard_points is the maximum number of groupTime intervals fetched per query (0 fetches the range in one query,
+    other values must be at least MIN_SHARD_POINTS) and batch_statements is the maximum number of queries sent
+    together in one request
+"""
+class InfluxConfig:
+    def __init__(self, ip="localhost", port=8086, user="prom", password="prom", db="prometheus", concurrency=1,
+                 shard_points=10000, batch_statements=10):
+        if shard_points and shard_points < MIN_SHARD_POINTS:
+            raise ValueError("shard_points must be 0 or at least %d, every shard also queries %d intervals on "
+                             "both sides" % (MIN_SHARD_POINTS, SHARD_MARGIN))
+        self.ip = ip
+        self.port = port
+        self.user = user
+        self.password = password
+        self.db = db
+        self.concurrency = concurrency
+        self.shard_points = shard_points
+        self.batch_statements = batch_statements
+
+"""
+    Result of one statement of a query, raw is the decoded JSON result like in the influxdb package
+"""
+class QueryResult:
+    def __init__(self, raw):
+        self.raw = raw
+
+    def get_points(self):
+        for series in self.raw.get('series', []):
+            for point in series.get('values', []):
+                yield dict(zip(series['columns'], point))
+
+"""
+    Minimal InfluxDB client talking to the /query HTTP endpoint with requests. The influxdb package imports pandas
+    when it is imported, which costs more than a fetch of a small range takes. The client remembers how long the
+    last HTTP request of each thread took and how many bytes it received, so the time spent waiting for the
+    server can be told apart from the time spent parsing the response
+"""
+class DBClient:
+    def __init__(self, host, port, username, password, database, pool_size=10):
+        self.url = "http://%s:%s/query" % (host, port)
+        self.auth = (username, password)
+        self.database = database
+        self.session = requests.Session()
+        self.session.mount("http://", requests.adapters.HTTPAdapter(pool_connections=pool_size,
+                                                                    pool_maxsize=pool_size))
+        self.last_request = threading.local()
+
+    """
+        Executes one or more statements separated by semicolons, returns a QueryResult for a single statement and
+        a list of them otherwise
+    """
+    def query(self, query, epoch=None):
+        params = {'q': query, 'db': self.database}
+        if epoch is not None:
+            params['epoch'] = epoch
+
+        start = time.time()
+        response = self.session.get(self.url, params=params, auth=self.auth)
+        self.last_request.seconds = time.time() - start
+        self.last_request.bytes = len(response.content)
+        if response.status_code != 200:
+            raise ValueError("Query failed with status %d: %s" % (response.status_code, response.text))
+
+        results = []
+        for raw in response.json().get('results', []):
+            if 'error' in raw:
+                raise ValueError("Query failed: " + raw['error'])
+            results.append(QueryResult(raw))
+
+        if len(results) == 1:
+            return results[0]
+        return results
+
+"""
+    Returns the peak resident size of the process so far in kB
+"""
+def peak_rss():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+"""
+    Collects the wall time and memory growth of the stages of a fetch, the bytes received and the points fetched
+    per series. The stages are query (waiting for the server), parse (decoding the response), process
+    (process_query_result), fill, normalize, align and reorder (converting to the row format). The time of a
+    stage is summed over all its calls, also when they run at the same time on a pool. Memory is the growth of
+    the peak resident size of the process (getrusage) in kB from the start to the end of every call, summed
+    over the calls, so a stage that allocates more than any stage before it shows up with its share. The peak
+    is per process, so calls running at the same time on a pool can't be told apart and the growth of one is
+    counted for every stage that overlaps it. The growth of a request is counted under parse, the response
+    is received and decoded in one call. If path is set, finish appends the report to it as one JSON line,
+    with the peak resident size of the whole process
+"""
+class FetchReport:
+    def __init__(self, path=None):
+        self.path = path
+        self.started = time.time()
+        self.seconds = None
+        self.stages = {}
+        self.bytes_received = 0
+        self.points = {}
+        self.lock = threading.Lock()
+
+    def add(self, stage, seconds, rss_growth=0):
+        with self.lock:
+            entry = self.stages.setdefault(stage, {'calls': 0, 'seconds': 0.0, 'rss_growth_kb': 0})
+            entry['calls'] += 1
+            entry['seconds'] += seconds
+            entry['rss_growth_kb'] += rss_growth
+
+    @contextmanager
+    def measure(self, stage):
+        rss = peak_rss()
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.add(stage, time.time() - start, peak_rss() - rss)
+
+    def count_bytes(self, count):
+        with self.lock:
+            self.bytes_received += count
+
+    def count_points(self, label, count):
+        with self.lock:
+            self.points[label] = self.points.get(label, 0) + count
+
+    def to_dict(self):
+        return {
+            'started': self.started,
+            'seconds': self.seconds,
+            'stages': self.stages,
+            'bytes_received': self.bytes_received,
+            'points': self.points,
+            'peak_rss_kb': peak_rss()
+        }
+
+    def finish(self):
+        self.seconds = time.time() - self.started
+        if self.path is not None:
+            with open(self.path, "a") as file_handle:
+                file_handle.write(json.dumps(self.to_dict()) + "\n")
+        return self
+
+"""
+    Creates a DB client that can be used to execute a query. Clients are cached so later calls with the same
+    settings reuse the same pooled HTTP session
+"""
+def get_DB_client(ip, port, user, password, db, pool_size=10):
+    pool_size = max(pool_size, 10)
+    key = (ip, port, user, password, db, pool_size)
+    if key in DB_CLIENTS:
+        return DB_CLIENTS[key]
+
+    try:
+        client = DBClient(ip, port, user, password, db, pool_size=pool_size)
+    except ConnectionError as error:
+        print >> sys.stderr, ("Error connecting to database")
+        exit(1)
+
+    DB_CLIENTS[key] = client
+    return client
+
+"""
+    Checks if a key exists and is set in a dict
+"""
+def is_dict_key_set(dict, test_key):
+    return (test_key in dict and dict[test_key])
+
+"""
+    Executes a query and return the result, the time and bytes are added to the report if one is given
+"""
+def execute_query(client, query, report=None):
+    # Written in one call so lines from concurrent queries don't interleave
+    sys.stdout.write("Querying: " + query + "\n")
+    rss = peak_rss()
+    start = time.time()
+    result = client.query(query, epoch='s')
+
+    if report is not None:
+        seconds = time.time() - start
+        rss_growth = peak_rss() - rss
+        last_request = getattr(client, 'last_request', None)
+        if hasattr(last_request, 'seconds'):
+            report.add('query', last_request.seconds)
+            report.add('parse', seconds - last_request.seconds, rss_growth)
+            report.count_bytes(last_request.bytes)
+        else:
+            report.add('query', seconds, rss_growth)
+
+    return result
+
+"""
+    Executes several queries in one request and returns one result per query
+"""
+def execute_queries(client, queries, report=None):
+    results = execute_query(client, "; ".join(queries), report)
+    if not isinstance(results, list):
+        results = [results]
+
+    if len(results) != len(queries):
+        raise ValueError("Got %d results for %d queries" % (len(results), len(queries)))
+
+    return results
+
+
+"""
+    Creates the SELECT part of the query
+"""
+def get_value_string(flags):
+    value = "mean(\"f64\")"
+
+    if flags['sum']:
+        value = "sum(\"f64\")"
+
+    if flags['rate'] and flags['nonNegRate']:
+        raise ValueError("Cannot have both rate and nonNegRate set")
+
+    if flags['rate']:
+        value = "derivative(mean(\"f64\"), " + flags['rateTime'] + ")"
+
+    if flags['nonNegRate']:
+        value = "non_negative_derivative(mean(\"f64\"), " + flags['rateTime'] + ")"
+
+    if flags['smooth']:
+        value = "moving_average(" + value + ", " + str(flags['smoothLevel']) + ")"
+
+    return value
+
+
+"""
+    Create the WHERE part of the query
+"""
+def get_where_string(name, flags, times):
+    if name[0] == '/' and name[-1] == '/':
+        where = "(\"__name__\" =~ " + name + ")"
+    else:
+        where = "(\"__name__\" = '" + name + "')"
+
+
+
+    for where_entry in flags['where']:
+        where += " AND (" + where_entry + ")"
+
+    if is_dict_key_set(times, 'startTime'):
+        where += " AND (time >= " + times['startTime'] + ")"
+
+    if is_dict_key_set(times, 'stopTime'):
+        where += " AND (time <= " + times['stopTime'] + ")"
+
+    return where
+
+
+"""
+    Create the GROUP BY part of the query
+"""
+def get_group_string(flags, groupTime):
+    group = "time(" + groupTime + ")"
+
+    for group_entry in flags['group']:
+        group += ", " + group_entry
+
+    return group + " fill(linear)"
+
+
+"""
+    Returns the flags of a metric config with the default value for all flags that aren't set
+"""
+def get_flags(metric):
+    # Default flags
+    flags = {
+        'rate': False,
+        'sum': False,
+        'nonNegRate': False,
+        'rateTime': "1s",
+        'where': [],
+        'group': [],
+        'smooth': False,
+        'smoothLevel': 5
+    }
+
+    for key in metric.get('flags', {}).keys():
+        if key in flags:
+            flags[key] = metric['flags'][key]
+
+    return flags
+
+
+"""
+    Generates the influxDB query from the measure info that can be executed
+"""
+def generate_query(metric, times, groupTime):
+    if is_dict_key_set(metric, 'name'):
+        name = metric['name']
+    else:
+        raise ValueError("Needs to have a name")
+
+    flags = get_flags(metric)
+    value = get_value_string(flags)
+    where = get_where_string(name, flags, times)
+    group = get_group_string(flags, groupTime)
+    return "SELECT " + value + " AS \"data_value\" FROM \"_\" WHERE (" + where + ") GROUP BY " + group
+
+
+"""
+    Takes a Result set and converts it to an array with [times, values] per series, where times are int64 epoch
+    seconds and values are float64 with NaN for missing values, and an array with feature names. The arrays are
+    built straight from the raw response without going through the points of the Result set
+"""
+def process_query_result(query_result):
+    values = []
+    feature_names = []
+    for series in query_result.raw.get('series', []):
+        tag_only = series.get('tags', {})
+        tag_string = " and ".join(tag_key + ": " + tag_only[tag_key] for tag_key in tag_only.keys())
+
+        columns = series['columns']
+        points = np.array(series['values'], dtype=np.float64)
+        if len(points) == 0:
+            continue
+
+        time = points[:, columns.index('time')].astype(np.int64)
+        data = np.ascontiguousarray(points[:, columns.index('data_value')])
+
+        values.append([time, data])
+        feature_names.append(tag_string)
+    return values, feature_names
+
+"""
+    Fills the edges that have missing values and extrapolate with the first/last values
+"""
+def fill_edges(data):
+    # For all values
+    for time_value in data:
+        present = np.flatnonzero(~np.isnan(time_value[1]))
+        if len(present) == 0:
+            continue
+
+        # Fill all entries before first value and after last value
+        time_value[1][:present[0]] = time_value[1][present[0]]
+        time_value[1][present[-1] + 1:] = time_value[1][present[-1]]
+
+    return data
+
+"""
+    Normalizes so the data will be in the range 0, 1
+"""
+def normalize_data(data):
+    all_values = np.concatenate([time_value[1] for time_value in data])
+    if np.isnan(all_values).all():
+        return data
+
+    return scale_data(data, np.nanmin(all_values), np.nanmax(all_values))
+
+"""
+    Scales the data so min_value becomes 0 and max_value becomes 1
+"""
+def scale_data(data, min_value, max_value):
+    value_range = (max_value - min_value) or 1.0
+
+    for time_value in data:
+        time_value[1] = (time_value[1] - min_value) / value_range
+
+    return data
+
+"""
+    Parses an InfluxQL duration such as "1m", "10s" or "1h30m" into whole seconds. Zero is only allowed with
+    allow_zero, it is a valid offset from now() but not a valid groupTime
+"""
+def parse_duration(duration, allow_zero=False):
+    parts = re.findall(r"(\d+)(ns|us|u|ms|s|m|h|d|w)", duration)
+    if not parts or "".join(count + unit for count, unit in parts) != duration:
+        raise ValueError("Invalid duration: " + duration)
+
+    nanoseconds = 0
+    for count, unit in parts:
+        nanoseconds += int(count) * DURATION_UNITS[unit]
+
+    seconds, rest = divmod(nanoseconds, DURATION_UNITS['s'])
+    if rest != 0 or (seconds == 0 and not allow_zero):
+        raise ValueError("Duration must be a whole number of seconds: " + duration)
+
+    return seconds
+
+"""
+    Parses an absolute InfluxQL time such as "1530111004s" or a bare nanosecond epoch into epoch seconds. Times
+    relative to now() such as "now() - 1h" are only resolved if now (epoch seconds) is given, otherwise None is
+    returned for them
+"""
+def parse_epoch(time_string, now=None):
+    match = re.match(r"^\s*(\d+)(ns|us|u|ms|s|m|h|d|w)?\s*$", time_string)
+    if match:
+        return int(match.group(1)) * DURATION_UNITS[match.group(2) or 'ns'] // DURATION_UNITS['s']
+
+    match = re.match(r"^\s*now\(\)\s*(?:([+-])\s*(\w+))?\s*$", time_string)
+    if match and now is not None:
+        if not match.group(1):
+            return now
+        if match.group(1) == '-':
+            return now - parse_duration(match.group(2), allow_zero=True)
+        return now + parse_duration(match.group(2), allow_zero=True)
+
+    return None
+
+"""
+    Returns the number of groupTime intervals before a shard that derivative and moving_average need to
+    calculate the first value of the shard
+"""
+def get_warmup(flags):
+    warmup = 0
+
+    if flags['rate'] or flags['nonNegRate']:
+        warmup += 1
+
+    if flags['smooth']:
+        warmup += int(flags['smoothLevel']) - 1
+
+    return warmup
+
+"""
+    Splits the time range into shards of at most shard_points groupTime intervals. The shard boundaries are
+    multiples of groupTime, every shard also queries margin intervals past its boundaries and warmup intervals
+    more before its start, so the values next to a boundary are calculated from the same points as in a single
+    query. Returns a list of (times, first_time, end_time) where only the points from first_time up to, not
+    including, end_time belong to the shard (None for the edges of the range). The whole range is returned as
+    one shard if it is short enough or if the start and stop times aren't absolute. With warm_first the first
+    shard also queries before its start, used when the start is a boundary in a range that was partly fetched
+    before
+"""
+def shard_times(times, groupTime, shard_points, warmup=0, warm_first=False, margin=SHARD_MARGIN):
+    start = None
+    stop = None
+    if is_dict_key_set(times, 'startTime'):
+        start = parse_epoch(times['startTime'])
+    if is_dict_key_set(times, 'stopTime'):
+        stop = parse_epoch(times['stopTime'])
+
+    if start is None or stop is None:
+        return [(times, None, None)]
+
+    step = parse_duration(groupTime)
+    boundaries = []
+    if shard_points:
+        shard_length = shard_points * step
+        boundaries = list(range(start - start % step + shard_length, stop + 1, shard_length))
+
+    shards = []
+    shard_start = start
+    for boundary in boundaries + [None]:
+        shard = dict(times)
+        first_time = None
+        if shard_start != start or warm_first:
+            shard['startTime'] = str(shard_start - (warmup + margin) * step) + "s"
+            first_time = shard_start
+        if boundary is not None:
+            # Bare integers are nanoseconds, so this stops right before the end of the margin
+            shard['stopTime'] = str(min(boundary + margin * step, stop + 1) * DURATION_UNITS['s'] - 1)
+        shards.append((shard, first_time, boundary))
+        shard_start = boundary
+
+    return shards
+
+"""
+    Fills NaN entries in every column with the last non NaN value above it, entries without any value above
+    them are set to initial
+"""
+def forward_fill(matrix, initial=0.0):
+    rows = np.arange(matrix.shape[0])[:, np.newaxis]
+    index = np.where(np.isnan(matrix), 0, rows)
+    np.maximum.accumulate(index, axis=0, out=index)
+    filled = matrix[index, np.arange(matrix.shape[1])]
+    filled[np.isnan(filled)] = initial
+    return filled
+
+"""
+    Snaps all series onto one shared epoch grid with step seconds between points. The grid spans from the
+    earliest start to the latest stop of all series. Every series is extended to the edges with its
+    first/last value and gaps are filled with the last known value.
+
+    Takes data on the form:
+    [
+      [
+        [t1, t2, ...],
+        [m1_1, m1_2, ...]
+      ], [
+        [t1, t2, ...],
+        [m2_1, m2_2, ...]
+      ], ...
+    ]
+
+    and returns a matrix with one row per grid point and one column per series:
+    [
+      [m1_1, m2_1, ...],
+      [m1_2, m2_2, ...],
+      ...
+    ]
+    and the grid times as epoch seconds
+    [t1, t2, ...]
+"""
+def align_series(data, step, dtype=np.float64):
+    start = min(time_value[0][0] for time_value in data)
+    stop = max(time_value[0][-1] for time_value in data)
+    start -= start % step
+    length = (stop - start) // step + 1
+
+    aligned = np.full((length, len(data)), np.nan, dtype=dtype)
+    for column, time_value in enumerate(data):
+        index = (np.asarray(time_value[0], dtype=np.int64) - start) // step
+        values = np.asarray(time_value[1], dtype=dtype)
+        aligned[index, column] = values
+        # Extend the series to the edges of the grid
+        aligned[:index[0], column] = values[0]
+        aligned[index[-1] + 1:, column] = values[-1]
+
+    times = start + step * np.arange(length, dtype=np.int64)
+    return forward_fill(aligned), times
+
+"""
+    Removes the warmup and margin points before first_time and the margin points from end_time on from the
+    series of a shard
+"""
+def drop_warmup(result, first_time, end_time=None):
+    if first_time is not None or end_time is not None:
+        for time_value in result:
+            keep = np.ones(len(time_value[0]), dtype=bool)
+            if first_time is not None:
+                keep &= time_value[0] >= first_time
+            if end_time is not None:
+                keep &= time_value[0] < end_time
+            time_value[0] = time_value[0][keep]
+            time_value[1] = time_value[1][keep]
+
+    return result
+
+"""
+    Concatenates the series from consecutive shards of the same metric config, series are matched by label.
+    A series that first shows up in a later shard is placed after the series it follows there, so the order is
+    the same as in a single query
+"""
+def stitch_shards(shard_results):
+    series = {}
+    labels = []
+    for result, label in shard_results:
+        position = 0
+        for time_value, name in zip(result, label):
+            if name not in series:
+                series[name] = []
+                labels.insert(position, name)
+            position = labels.index(name) + 1
+            if len(time_value[0]) > 0:
+                series[name].append(time_value)
+
+    result = []
+    labels = [name for name in labels if series[name]]
+    for name in labels:
+        result.append([np.concatenate([time_value[0] for time_value in series[name]]),
+                       np.concatenate([time_value[1] for time_value in series[name]])])
+
+    return result, labels
+
+"""
+    Plans the fetch of a metric config. Returns the part that can be served from the cache as (result, labels),
+    the time shards that still have to be fetched and the cache key information to store the merged result
+    under (None if the result can't be cached). Only ranges with an absolute start time are cached, and only
+    the intervals after the cached ones, usually the newest tail, are fetched again
+"""
+def plan_metric(metric_config, times, groupTime, shard_points, cache, now):
+    warmup = get_warmup(get_flags(metric_config))
+
+    start = None
+    if is_dict_key_set(times, 'startTime'):
+        start = parse_epoch(times['startTime'])
+    if cache is None or start is None:
+        return ([], []), shard_times(times, groupTime, shard_points, warmup), None
+
+    stop = now
+    if is_dict_key_set(times, 'stopTime'):
+        stop = parse_epoch(times['stopTime'], now)
+    if stop is None:
+        return ([], []), shard_times(times, groupTime, shard_points, warmup), None
+
+    step = parse_duration(groupTime)
+    query = generate_query(metric_config, {}, groupTime)
+
+    # Relative stop times are resolved once so the cached and fetched parts agree on where the range ends
+    fetch_times = dict(times)
+    if not is_dict_key_set(times, 'stopTime') or parse_epoch(times['stopTime']) is None:
+        fetch_times['stopTime'] = str(stop) + "s"
+
+    cached = ([], [])
+    tail_from = start
+    entry = cache.load(query, start)
+    if entry is not None and min(entry['stable'], stop - stop % step) > start:
+        tail_from = min(entry['stable'], stop - stop % step)
+        values = []
+        for time_value in entry['values']:
+            keep = time_value[0] < tail_from
+            values.append([time_value[0][keep], time_value[1][keep]])
+        cached = (values, entry['labels'])
+        fetch_times['startTime'] = str(tail_from) + "s"
+
+    shards = shard_times(fetch_times, groupTime, shard_points, warmup, warm_first=(tail_from != start))
+    return cached, shards, (query, start, stop, step)
+
+"""
+    Applies edge filling and normalization to the stitched series of a metric config and adds the metric name to
+    the labels
+"""
+def finish_metric(metric_config, result, label, report=None):
+    if report is None:
+        report = FetchReport()
+
+    norm = False
+    fill = False
+    if is_dict_key_set(metric_config, 'flags'):
+        if is_dict_key_set(metric_config['flags'], 'normalize'):
+            norm = True
+        if is_dict_key_set(metric_config['flags'], 'fill'):
+            fill = True
+
+    label = [metric_config['name'] + ": " + s for s in label]
+    if fill:
+        with report.measure('fill'):
+            result = fill_edges(result)
+    if norm:
+        with report.measure('normalize'):
+            result = normalize_data(result)
+
+    return result, label
+
+"""
+    On-disk cache of fetched series. Entries are keyed by the query text without time bounds (which contains the
+    groupTime) and the start time, and store the raw series before edge filling and normalization in an .npz
+    file. An index file keeps track of the entries so the least recently used ones can be evicted when the
+    cache grows above max_bytes
+"""
+class QueryCache:
+    def __init__(self, path=os.path.join("~", ".cache", "kube-learn", "queries"), max_bytes=1024 ** 3):
+        self.path = os.path.expanduser(path)
+        self.max_bytes = max_bytes
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+
+    def get_key(self, query, start):
+        normalized = " ".join(query.split())
+        return hashlib.sha1((normalized + "|" + str(start)).encode("utf-8")).hexdigest()
+
+    def read_index(self):
+        try:
+            with open(os.path.join(self.path, "index.json")) as file_handle:
+                return json.load(file_handle)
+        except (IOError, ValueError):
+            return {}
+
+    def write_index(self, index):
+        # Written to a temporary file first so a crash never leaves a broken index behind
+        temp_path = os.path.join(self.path, "index.json.tmp")
+        with open(temp_path, "w") as file_handle:
+            json.dump(index, file_handle)
+        os.rename(temp_path, os.path.join(self.path, "index.json"))
+
+    def remove(self, index, key):
+        del index[key]
+        try:
+            os.remove(os.path.join(self.path, key + ".npz"))
+        except OSError:
+            pass
+
+    """
+        Returns the cached entry for a query and start time as a dict with 'stop', 'stable', 'labels' and
+        'values' (a list of [times, values] per series) or None if nothing is cached
+    """
+    def load(self, query, start):
+        key = self.get_key(query, start)
+        index = self.read_index()
+        if key not in index:
+            return None
+
+        try:
+            with np.load(os.path.join(self.path, key + ".npz")) as arrays:
+                times = arrays['times']
+                values = arrays['values']
+                offsets = arrays['offsets']
+        except (IOError, KeyError):
+            self.remove(index, key)
+            self.write_index(index)
+            return None
+
+        index[key]['used'] = time.time()
+        self.write_index(index)
+
+        entry = dict(index[key])
+        entry['values'] = [[times[offsets[i]:offsets[i + 1]], values[offsets[i]:offsets[i + 1]]]
+                           for i in range(len(offsets) - 1)]
+        return entry
+
+    """
+        Returns the first groupTime interval of the series that has to be fetched again next time, the last
+        interval might not have been complete and missing values at the end might get interpolated once newer
+        data arrives
+    """
+    def get_stable(self, result, stop, step):
+        stable = stop - stop % step
+        for time_value in result:
+            present = np.flatnonzero(~np.isnan(time_value[1]))
+            if len(present) == 0:
+                stable = min(stable, time_value[0][0])
+            elif present[-1] + 1 < len(time_value[1]):
+                stable = min(stable, time_value[0][present[-1] + 1])
+        return int(stable)
+
+    """
+        Stores the series fetched for a query from start to stop. An existing entry that is stable up to a later
+        time is kept, so fetching a shorter range never throws cached data away. Otherwise the points of the
+        existing entry after stop are merged into the new series
+    """
+    def store(self, query, name, start, stop, step, result, labels):
+        stable = self.get_stable(result, stop, step)
+
+        existing = self.load(query, start)
+        if existing is not None:
+            if existing['stable'] >= stable:
+                return
+            if existing['stop'] > stop:
+                merged = dict(zip(labels, result))
+                for label, time_value in zip(existing['labels'], existing['values']):
+                    later = time_value[0] > stop
+                    if label not in merged:
+                        labels = labels + [label]
+                        merged[label] = [time_value[0][later], time_value[1][later]]
+                    else:
+                        merged[label] = [np.concatenate([merged[label][0], time_value[0][later]]),
+                                         np.concatenate([merged[label][1], time_value[1][later]])]
+                result = [merged[label] for label in labels]
+                stop = existing['stop']
+                stable = self.get_stable([tv for tv in result if len(tv[0]) > 0], stop, step)
+
+        key = self.get_key(query, start)
+        file_path = os.path.join(self.path, key + ".npz")
+        offsets = np.cumsum([0] + [len(time_value[0]) for time_value in result])
+        with open(file_path, "wb") as file_handle:
+            np.savez(file_handle,
+                     times=np.concatenate([np.empty(0, dtype=np.int64)] + [tv[0] for tv in result]),
+                     values=np.concatenate([np.empty(0)] + [tv[1] for tv in result]),
+                     offsets=offsets)
+
+        index = self.read_index()
+        index[key] = {
+            'name': name,
+            'query': query,
+            'start': start,
+            'stop': stop,
+            'stable': stable,
+            'labels': labels,
+            'size': os.path.getsize(file_path),
+            'used': time.time()
+        }
+        self.evict(index, keep=key)
+        self.write_index(index)
+
+    """
+        Removes the least recently used entries until the cache is smaller than max_bytes
+    """
+    def evict(self, index, keep=None):
+        total = sum(entry['size'] for entry in index.values())
+        for key in sorted(index.keys(), key=lambda key: index[key]['used']):
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            total -= index[key]['size']
+            self.remove(index, key)
+
+    """
+        Removes all cached entries for a metric name
+    """
+    def invalidate(self, name):
+        index = self.read_index()
+        for key in [key for key, entry in index.items() if entry['name'] == name]:
+            self.remove(index, key)
+        self.write_index(index)
+
+    """
+        Removes all cached entries
+    """
+    def clear(self):
+        index = self.read_index()
+        for key in list(index.keys()):
+            self.remove(index, key)
+        self.write_index(index)
+
+"""
+    Checks that the query config has metrics and sets the default times and groupTime
+"""
+def check_query_configs(query_configs):
+    if not is_dict_key_set(query_configs, 'metrics'):
+        raise ValueError("Query config needs to have some metrics")
+
+    if not is_dict_key_set(query_configs, 'times'):
+        query_configs['times'] = {}
+
+    if not is_dict_key_set(query_configs, 'groupTime'):
+        query_configs['groupTime'] = "1s"
+
+"""
+    Fetches a list of (metric index, shard times, first time, end time) tasks and returns the series and labels
+    of every task with only the points the shard owns. Identical queries are only sent once and up to batch_statements queries are
+    packed into one request. The requests are sent on the pool, or one at a time without a pool
+"""
+def fetch_tasks(client, query_configs, tasks, pool=None, batch_statements=1, report=None):
+    if report is None:
+        report = FetchReport()
+
+    queries = []
+    query_indexes = {}
+    task_queries = []
+    for metric_index, shard, first_time, end_time in tasks:
+        query = generate_query(query_configs['metrics'][metric_index], shard, query_configs['groupTime'])
+        if query not in query_indexes:
+            query_indexes[query] = len(queries)
+            queries.append(query)
+        task_queries.append(query_indexes[query])
+
+    batch_size = max(batch_statements, 1)
+    batches = [queries[i:i + batch_size] for i in range(0, len(queries), batch_size)]
+
+    def fetch(batch):
+        processed = []
+        for query_result in execute_queries(client, batch, report):
+            with report.measure('process'):
+                processed.append(process_query_result(query_result))
+        return processed
+
+    if pool is None:
+        fetched = [fetch(batch) for batch in batches]
+    else:
+        # map keeps the batch order so the labels are the same as when fetching one at a time
+        fetched = pool.map(fetch, batches)
+    fetched = [result for batch in fetched for result in batch]
+
+    results = []
+    used = set()
+    for (metric_index, shard, first_time, end_time), query_index in zip(tasks, task_queries):
+        result, label = fetched[query_index]
+        if query_index in used:
+            # Later steps change the arrays in place, so repeated queries get their own copy
+            result = [[time_value[0].copy(), time_value[1].copy()] for time_value in result]
+        used.add(query_index)
+        results.append((drop_warmup(result, first_time, end_time), label))
+
+    return results
+
+"""
+    Saves a result from get_metrics to a self-describing binary file. The file starts with a JSON header with the
+    feature names, the array layout and the query config that produced the data, followed by the epoch times and
+    the data matrix as raw arrays that load_metrics can memory-map. Only columnar results can be saved, the naive
+    local datetimes of the row format are ambiguous in the hour a DST change repeats
+"""
+def save_metrics(result, path, query_configs=None):
+    data = result['data']
+    times = result['times']
+    if not isinstance(data, np.ndarray):
+        raise ValueError("Only columnar results can be saved, fetch them with get_metrics(..., columnar=True)")
+
+    data = np.ascontiguousarray(data, dtype=np.dtype(data.dtype).newbyteorder('<'))
+    times = np.ascontiguousarray(times, dtype='<i8')
+
+    header = {
+        'version': 1,
+        'dtype': data.dtype.str,
+        'shape': list(data.shape),
+        'feature_names': list(result['feature_names']),
+        'query_configs': query_configs
+    }
+    # The offsets are part of the header, so reserve room for them before the length is known
+    header_bytes = json.dumps(header).encode('utf-8') + b" " * 64
+    start = len(METRICS_FILE_MAGIC) + 8 + len(header_bytes)
+    header['times_offset'] = start + -start % METRICS_FILE_ALIGNMENT
+    data_offset = header['times_offset'] + times.nbytes
+    header['data_offset'] = data_offset + -data_offset % METRICS_FILE_ALIGNMENT
+    header_bytes = json.dumps(header).encode('utf-8')
+    header_bytes += b" " * (header['times_offset'] - len(METRICS_FILE_MAGIC) - 8 - len(header_bytes))
+
+    with open(path, "wb") as file_handle:
+        file_handle.write(METRICS_FILE_MAGIC)
+        file_handle.write(struct.pack("<Q", len(header_bytes)))
+        file_handle.write(header_bytes)
+        times.tofile(file_handle)
+        file_handle.write(b"\0" * (header['data_offset'] - data_offset))
+        data.tofile(file_handle)
+
+"""
+    Loads a file written by save_metrics as a columnar result with the query config added under 'query_configs'.
+    With mmap the arrays are read-only memory maps of the file, so opening is instant and processes that load the
+    same file share the pages. Without mmap the arrays are read into memory
+"""
+def load_metrics(path, mmap=True):
+    with open(path, "rb") as file_handle:
+        if file_handle.read(len(METRICS_FILE_MAGIC)) != METRICS_FILE_MAGIC:
+            raise ValueError("Not a metrics file: " + path)
+        header_length = struct.unpack("<Q", file_handle.read(8))[0]
+        header = json.loads(file_handle.read(header_length).decode('utf-8'))
+
+        if header['version'] != 1:
+            raise ValueError("Unsupported metrics file version %d" % header['version'])
+
+        shape = tuple(header['shape'])
+        if mmap:
+            times = np.memmap(file_handle, dtype='<i8', mode='r', offset=header['times_offset'],
+                              shape=(shape[0],))
+            data = np.memmap(file_handle, dtype=header['dtype'], mode='r', offset=header['data_offset'],
+                             shape=shape)
+        else:
+            file_handle.seek(header['times_offset'])
+            times = np.fromfile(file_handle, dtype='<i8', count=shape[0])
+            file_handle.seek(header['data_offset'])
+            data = np.fromfile(file_handle, dtype=header['dtype'], count=shape[0] * shape[1]).reshape(shape)
+
+    feature_names = header['feature_names']
+    return {
+        'data': data,
+        'feature_names': feature_names,
+        'times': times,
+        'columns': dict((label, column) for column, label in enumerate(feature_names)),
+        'query_configs': header['query_configs']
+    }
+
+"""
+    Converts a columnar result from get_metrics to the dict format with a list of rows and a list of datetimes
+"""
+def to_row_format(result):
+    return {
+        'data': result['data'].tolist(),
+        'feature_names': result['feature_names'],
+        'times': [datetime.fromtimestamp(time) for time in result['times'].tolist()]
+    }
+
+"""
+    Returns metrics that is specified in the query config from the database that's specified in the influx config.
+
+    By default the result is a dict with the data as a list of rows, the feature names and a list of datetimes.
+    With columnar set the result is instead a dict with:
+        'data': a C-contiguous 2-D array of dtype with one row per time and one column per feature
+        'times': an int64 array with the times as epoch seconds
+        'feature_names': the feature names in column order
+        'columns': a dict from feature name to column index
+
+    If a QueryCache is given, ranges with an absolute start time are served from it and only the intervals that
+    aren't cached yet are queried. If a FetchReport is given, the time and memory of every stage are recorded in
+    it, finishing it is left to the caller
+"""
+def get_metrics(query_configs, influx_config, columnar=False, dtype=np.float64, cache=None, report=None):
+    if report is None:
+        report = FetchReport()
+
+    client = get_DB_client(influx_config.ip, influx_config.port, influx_config.user,
+                           influx_config.password, influx_config.db, influx_config.concurrency)
+    data = []
+    labels = []
+    check_query_configs(query_configs)
+
+    # Split every metric config into time shards, all shards of all metrics are fetched in one pool
+    now = int(time.time())
+    plans = []
+    tasks = []
+    for metric_index, metric_config in enumerate(query_configs['metrics']):
+        cached, shards, cache_key = plan_metric(metric_config, query_configs['times'], query_configs['groupTime'],
+                                                influx_config.shard_points, cache, now)
+        plans.append((cached, cache_key))
+        for shard, first_time, end_time in shards:
+            tasks.append((metric_index, shard, first_time, end_time))
+
+    pool = None
+    if influx_config.concurrency > 1:
+        pool = ThreadPool(influx_config.concurrency)
+    try:
+        fetched = fetch_tasks(client, query_configs, tasks, pool, influx_config.batch_statements, report)
+    finally:
+        if pool is not None:
+            pool.close()
+
+    for metric_index, metric_config in enumerate(query_configs['metrics']):
+        cached, cache_key = plans[metric_index]
+        shard_results = [fetched[i] for i, task in enumerate(tasks) if task[0] == metric_index]
+        result, label = stitch_shards([cached] + shard_results)
+        if cache_key is not None:
+            query, start, stop, step = cache_key
+            cache.store(query, metric_config['name'], start, stop, step, result, label)
+        result, label = finish_metric(metric_config, result, label, report)
+        for time_value, name in zip(result, label):
+            report.count_points(name, len(time_value[0]))
+        data += result
+        labels += label
+
+    if len(data) == 0:
+        print ""
+        print "WARNING: no data was fetched"
+        metrics = np.empty((0, 0), dtype=dtype)
+        times = np.empty(0, dtype=np.int64)
+    else:
+        print "Merging data"
+
+        before = len(data[0][0])
+
+        with report.measure('align'):
+            metrics, times = align_series(data, parse_duration(query_configs['groupTime']), dtype)
+
+        if len(times) < 2:
+            raise ValueError("Measures don't overlap")
+
+        print "Lost %d%% of data" % ((before - len(times)) / float(before) * 100)
+
+    result = {
+        'data': metrics,
+        'feature_names': labels,
+        'times': times,
+        'columns': dict((label, column) for column, label in enumerate(labels))
+    }
+
+    if not columnar:
+        with report.measure('reorder'):
+            result = to_row_format(result)
+
+    return result
+
+"""
+    Aligns consecutive time windows onto one epoch grid and keeps the last value of every series between the
+    windows, so a long range can be aligned one window at a time. Columns are added as new series show up and
+    rows before the first point of any series are dropped
+"""
+class StreamAligner:
+    def __init__(self, step, dtype=np.float64):
+        self.step = step
+        self.dtype = dtype
+        self.columns = {}
+        self.labels = []
+        self.last = np.empty(0, dtype=dtype)
+        self.started = False
+
+    """
+        Aligns the series of the window from start to stop (epoch seconds, both included) and returns the
+        matrix and the grid times
+    """
+    def align(self, data, labels, start, stop):
+        start -= start % self.step
+        length = max((stop - start) // self.step + 1, 0)
+        known = len(self.last)
+
+        for label in labels:
+            if label not in self.columns:
+                self.columns[label] = len(self.labels)
+                self.labels.append(label)
+
+        # The first row is the last row of the previous window, so gaps are filled across windows
+        aligned = np.full((length + 1, len(self.labels)), np.nan, dtype=self.dtype)
+        aligned[0, :known] = self.last
+        first_row = length
+        for time_value, label in zip(data, labels):
+            if len(time_value[0]) == 0:
+                continue
+            column = self.columns[label]
+            index = (time_value[0] - start) // self.step + 1
+            inside = (index >= 1) & (index <= length)
+            if not inside.any():
+                continue
+            index = index[inside]
+            aligned[index, column] = time_value[1][inside]
+            first_row = min(first_row, index[0] - 1)
+            if column >= known:
+                # Extend new series to the start of the window
+                aligned[1:index[0], column] = time_value[1][inside][0]
+
+        aligned = forward_fill(aligned)[1:]
+        times = start + self.step * np.arange(length, dtype=np.int64)
+        if length > 0:
+            self.last = aligned[-1].copy()
+
+        if not self.started:
+            if first_row == length:
+                self.last = np.empty(0, dtype=self.dtype)
+                return aligned[:0], times[:0]
+            self.started = True
+            aligned = aligned[first_row:]
+            times = times[first_row:]
+
+        return aligned, times
+
+"""
+    Returns the min and max value of a metric config over the whole time range, calculated by the server
+"""
+def get_value_range(client, metric_config, times, groupTime):
+    query = "SELECT min(\"data_value\") AS \"min_value\", max(\"data_value\") AS \"max_value\" FROM (" + \
+            generate_query(metric_config, times, groupTime) + ")"
+    points = list(execute_query(client, query).get_points())
+    if len(points) == 0 or points[0]['min_value'] is None:
+        return None
+
+    return points[0]['min_value'], points[0]['max_value']
+
+"""
+    Generator version of get_metrics that yields time aligned batches of at most batch rows as soon as every
+    metric config has been fetched for that time window, so a long range can be consumed with constant memory.
+    Every batch is a dict with:
+        'data': a 2-D array of dtype with one row per time and one column per feature
+        'times': an int64 array with the times as epoch seconds
+        'feature_names': the feature names in column order
+
+    The range needs a start time, the stop time defaults to now. Columns are added as series show up, so later
+    batches can have more columns than earlier ones. Normalization uses the min and max of the whole range,
+    calculated by the server before the first batch. A series that shows up after the first batch is only
+    extended back to the start of its own batch, earlier batches have already been yielded with 0 for it
+"""
+def iter_metrics(query_configs, influx_config, batch=1000, dtype=np.float64):
+    client = get_DB_client(influx_config.ip, influx_config.port, influx_config.user,
+                           influx_config.password, influx_config.db, influx_config.concurrency)
+    check_query_configs(query_configs)
+
+    now = int(time.time())
+    times = dict(query_configs['times'])
+    groupTime = query_configs['groupTime']
+    step = parse_duration(groupTime)
+
+    start = None
+    stop = now
+    if is_dict_key_set(times, 'startTime'):
+        start = parse_epoch(times['startTime'], now)
+        if parse_epoch(times['startTime']) is None:
+            times['startTime'] = str(start) + "s"
+    if is_dict_key_set(times, 'stopTime'):
+        stop = parse_epoch(times['stopTime'], now)
+    if start is None or stop is None:
+        raise ValueError("Streaming needs a start time and an absolute or now() relative stop time")
+    if not is_dict_key_set(times, 'stopTime') or parse_epoch(times['stopTime']) is None:
+        times['stopTime'] = str(stop) + "s"
+
+    # All metric configs share the window boundaries, only the warmup differs
+    windows = []
+    value_ranges = []
+    for metric_config in query_configs['metrics']:
+        windows.append(shard_times(times, groupTime, batch, get_warmup(get_flags(metric_config))))
+        value_range = None
+        if is_dict_key_set(metric_config, 'flags') and is_dict_key_set(metric_config['flags'], 'normalize'):
+            value_range = get_value_range(client, metric_config, times, groupTime)
+        value_ranges.append(value_range)
+
+    aligner = StreamAligner(step, dtype)
+    pool = None
+    if influx_config.concurrency > 1:
+        pool = ThreadPool(influx_config.concurrency)
+    try:
+        window_starts = [first_time or start for shard, first_time, end_time in windows[0]]
+        window_stops = [window_start - step for window_start in window_starts[1:]] + [stop]
+        for window_index, window_start in enumerate(window_starts):
+            tasks = [(metric_index,) + shards[window_index] for metric_index, shards in enumerate(windows)]
+            fetched = fetch_tasks(client, query_configs, tasks, pool, influx_config.batch_statements)
+
+            data = []
+            labels = []
+            for metric_index, metric_config in enumerate(query_configs['metrics']):
+                result, label = fetched[metric_index]
+                label = [metric_config['name'] + ": " + s for s in label]
+                if is_dict_key_set(metric_config, 'flags') and is_dict_key_set(metric_config['flags'], 'fill'):
+                    # Only series that start in this window have a leading edge, later gaps are forward filled
+                    fill_edges([time_value for time_value, name in zip(result, label)
+                                if name not in aligner.columns])
+                if value_ranges[metric_index] is not None:
+                    result = scale_data(result, *value_ranges[metric_index])
+                data += result
+                labels += label
+
+            metrics, grid = aligner.align(data, labels, window_start, window_stops[window_index])
+            if len(grid) > 0:
+                yield {
+                    'data': metrics,
+                    'times': grid,
+                    'feature_names': list(aligner.labels)
+                }
+    finally:
+        if pool is not None:
+            pool.close()
+
+"""
+    Fixed size buffer that keeps the last capacity values. Every value is written twice, capacity apart, so the
+    values in order are always one contiguous slice and window can return a view without copying
+"""
+class RingBuffer:
+    def __init__(self, capacity, dtype=np.float64):
+        self.capacity = capacity
+        self.data = np.zeros(2 * capacity, dtype=dtype)
+        self.end = 0
+        self.count = 0
+
+    def extend(self, values):
+        values = np.asarray(values, dtype=self.data.dtype)[-self.capacity:]
+        index = (self.end + np.arange(len(values))) % self.capacity
+        self.data[index] = values
+        self.data[index + self.capacity] = values
+        self.end = (self.end + len(values)) % self.capacity
+        self.count = min(self.count + len(values), self.capacity)
+
+    """
+        Returns a view of the values from oldest to newest. The view isn't copied, so it changes when the
+        buffer is extended
+    """
+    def window(self):
+        return self.data[self.end + self.capacity - self.count:self.end + self.capacity]
+
+    """
+        Overwrites the newest len(values) values
+    """
+    def replace(self, values):
+        values = np.asarray(values, dtype=self.data.dtype)[-self.count:]
+        index = (self.end - len(values) + np.arange(len(values))) % self.capacity
+        self.data[index] = values
+        self.data[index + self.capacity] = values
+
+"""
+    Follows the metrics of a query config as new data arrives. Every poll queries the groupTime intervals that
+    completed since the last poll and appends the aligned values to one ring buffer of capacity values per
+    feature, with the times in a ring buffer of their own. Edge filling and gap filling carry on from the last
+    poll and normalization uses the min and max seen so far. Intervals that weren't ingested yet when they were
+    polled are forward filled, so every poll also queries again from the last value of the series that lags
+    most, at most max_lag intervals back, and replaces the forward filled rows of the series that got values
+    for them since. A poll costs O(new points + lag). The first poll fetches from the startTime of the query
+    config, or the last capacity intervals if it has none
+"""
+class MetricFollower:
+    def __init__(self, query_configs, influx_config, capacity=1440, dtype=np.float64, max_lag=60):
+        check_query_configs(query_configs)
+        self.query_configs = query_configs
+        self.influx_config = influx_config
+        self.client = get_DB_client(influx_config.ip, influx_config.port, influx_config.user,
+                                    influx_config.password, influx_config.db, influx_config.concurrency)
+        self.step = parse_duration(query_configs['groupTime'])
+        self.capacity = capacity
+        self.dtype = dtype
+        self.aligner = StreamAligner(self.step, dtype)
+        self.times = RingBuffer(capacity, np.int64)
+        self.buffers = {}
+        self.last_times = {}
+        self.value_ranges = [None] * len(query_configs['metrics'])
+        self.next_time = None
+        self.max_lag = max_lag
+        self.revised = 0
+
+    """
+        Returns the first time to query again, the interval after the last value of the series that lags most
+    """
+    def get_requery_time(self):
+        if self.times.count == 0 or not self.last_times:
+            return self.next_time
+        oldest = min(self.last_times.values()) + self.step
+        oldest = max(oldest, self.next_time - self.max_lag * self.step, self.times.window()[0])
+        return min(oldest, self.next_time)
+
+    """
+        Replaces the forward filled rows of a series from the time of its first new value on. The series only
+        has values after its last known value, so every row from there on was filled
+    """
+    def revise(self, label, time_value):
+        grid = self.times.window()
+        index = (time_value[0] - grid[0]) // self.step
+        inside = index >= 0
+        index, values = index[inside], time_value[1][inside]
+        if len(index) == 0:
+            return 0
+        if label not in self.buffers:
+            self.buffers[label] = RingBuffer(self.capacity, self.dtype)
+            self.buffers[label].extend(np.zeros(self.times.count, dtype=self.dtype))
+        window = self.buffers[label].window()
+
+        first = index[0]
+        revised = np.full(len(grid) - first + 1, np.nan, dtype=self.dtype)
+        revised[0] = window[first - 1] if first > 0 else np.nan
+        revised[index - first + 1] = values
+        self.buffers[label].replace(forward_fill(revised[:, np.newaxis])[1:, 0])
+        return len(revised) - 1
+
+    """
+        Fetches the intervals that completed since the last poll, and the lagging ones again, and returns the
+        number of new rows. The number of rows replaced is kept in revised
+    """
+    def poll(self, now=None):
+        if now is None:
+            now = int(time.time())
+        groupTime = self.query_configs['groupTime']
+
+        # The interval that now is in isn't complete yet
+        stop = now - now % self.step - self.step
+        if self.next_time is not None:
+            start = self.get_requery_time()
+        elif is_dict_key_set(self.query_configs['times'], 'startTime'):
+            start = parse_epoch(self.query_configs['times']['startTime'], now)
+        else:
+            start = stop - (self.capacity - 1) * self.step
+        if start is None:
+            raise ValueError("Can't follow from start time " + self.query_configs['times']['startTime'])
+        if start > stop:
+            return 0
+
+        times = {
+            'startTime': str(start) + "s",
+            # Bare integers are nanoseconds, so this stops right before the next interval
+            'stopTime': str((stop + self.step) * DURATION_UNITS['s'] - 1)
+        }
+        tasks = []
+        for metric_index, metric_config in enumerate(self.query_configs['metrics']):
+            warmup = get_warmup(get_flags(metric_config))
+            for shard, first_time, end_time in shard_times(times, groupTime, self.influx_config.shard_points, warmup,
+                                                           warm_first=(self.next_time is not None)):
+                tasks.append((metric_index, shard, first_time, end_time))
+
+        pool = None
+        if self.influx_config.concurrency > 1:
+            pool = ThreadPool(self.influx_config.concurrency)
+        try:
+            fetched = fetch_tasks(self.client, self.query_configs, tasks, pool,
+                                      self.influx_config.batch_statements)
+        finally:
+            if pool is not None:
+                pool.close()
+
+        data = []
+        labels = []
+        for metric_index, metric_config in enumerate(self.query_configs['metrics']):
+            result, label = stitch_shards([fetched[i] for i, task in enumerate(tasks) if task[0] == metric_index])
+            label = [metric_config['name'] + ": " + s for s in label]
+            flags = metric_config.get('flags', {})
+
+            for time_value, name in zip(result, label):
+                # Trailing nulls are intervals that weren't ingested yet, they are queried again next poll
+                present = np.flatnonzero(~np.isnan(time_value[1]))
+                keep = np.arange(len(time_value[0])) <= (present[-1] if len(present) else -1)
+                if name in self.last_times:
+                    keep &= time_value[0] > self.last_times[name]
+                time_value[0] = time_value[0][keep]
+                time_value[1] = time_value[1][keep]
+                if len(time_value[0]) > 0:
+                    self.last_times[name] = time_value[0][-1]
+
+            if is_dict_key_set(flags, 'fill'):
+                # Only new series have a leading edge, later gaps are forward filled
+                fill_edges([time_value for time_value, name in zip(result, label) if name not in self.aligner.columns])
+
+            if is_dict_key_set(flags, 'normalize') and len(result) > 0:
+                all_values = np.concatenate([time_value[1] for time_value in result])
+                if not np.isnan(all_values).all():
+                    value_range = (np.nanmin(all_values), np.nanmax(all_values))
+                    if self.value_ranges[metric_index] is not None:
+                        value_range = (min(value_range[0], self.value_ranges[metric_index][0]),
+                                       max(value_range[1], self.value_ranges[metric_index][1]))
+                    self.value_ranges[metric_index] = value_range
+                    result = scale_data(result, *value_range)
+
+            data += result
+            labels += label
+
+        # Values before next_time replace forward filled rows, the others are new rows
+        self.revised = 0
+        if self.next_time is not None:
+            for time_value, label in zip(data, labels):
+                early = time_value[0] < self.next_time
+                if early.any():
+                    self.revised += self.revise(label, [time_value[0][early], time_value[1][early]])
+                    time_value[0] = time_value[0][~early]
+                    time_value[1] = time_value[1][~early]
+                    if label not in self.aligner.columns:
+                        self.aligner.columns[label] = len(self.aligner.labels)
+                        self.aligner.labels.append(label)
+            if self.revised:
+                # Gaps of the new rows are filled from the revised last row
+                self.aligner.last = np.array([self.buffers[label].window()[-1] for label in self.aligner.labels],
+                                             dtype=self.dtype)
+            start = self.next_time
+
+        if start > stop:
+            return 0
+        self.next_time = stop + self.step
+        metrics, grid = self.aligner.align(data, labels, start, stop)
+
+        previous_rows = self.times.count
+        self.times.extend(grid)
+        for column, label in enumerate(self.aligner.labels):
+            if label not in self.buffers:
+                # New features are 0 for the rows that were buffered before they showed up
+                self.buffers[label] = RingBuffer(self.capacity, self.dtype)
+                self.buffers[label].extend(np.zeros(previous_rows, dtype=self.dtype))
+            self.buffers[label].extend(metrics[:, column])
+
+        return len(grid)
+
+    """
+        Returns a view of the buffered times (epoch seconds) from oldest to newest
+    """
+    def time_window(self):
+        return self.times.window()
+
+    """
+        Returns a view of the buffered values of a feature, aligned with time_window
+    """
+    def window(self, feature_name):
+        return self.buffers[feature_name].window()
+
+    """
+        Returns a dict from feature name to a view of its buffered values
+    """
+    def windows(self):
+        return dict((label, self.buffers[label].window()) for label in self.aligner.labels)
+
+    """
+        Generator that polls once every groupTime, delay seconds after each interval completes, and yields the
+        number of new rows after every poll
+    """
+    def follow(self, delay=1):
+        while True:
+            yield self.poll()
+            now = time.time()
+            time.sleep(self.step - now % self.step + delay)
+
+    """
+        Generator like follow that yields the new rows of every poll in the shape of iter_metrics, a dict with
+        the rows of 'data', their 'times' and the 'feature_names'. Polls without new rows yield nothing
+    """
+    def follow_batches(self, delay=1):
+        for rows in self.follow(delay):
+            rows = min(rows, self.times.count)
+            if rows == 0 or not self.aligner.labels:
+                continue
+            yield {
+                'data': np.column_stack([self.window(label)[-rows:] for label in self.aligner.labels]),
+                'times': self.time_window()[-rows:].copy(),
+                'feature_names': list(self.aligner.labels)
+            }
+
+if __name__ == '__main__':
+    print "Influx fetcher loaded"
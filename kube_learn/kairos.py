@@ -0,0 +1,97 @@
+"""Fetching metrics from KairosDB and parsing the pickled results"""
+from __future__ import absolute_import, print_function
+import pickle
+import re
+import sys
+
+
+def fetch(ip="127.0.0.1", port="8080", outfile=None, brief=False, regex=""):
+    """Fetch the last day of all metrics matching regex and pickle them to
+    outfile or stdout, with brief only the metric names are printed"""
+    import pyKairosDB
+    import requests
+
+    metric_filter = re.compile(regex)
+
+    try:
+        con = pyKairosDB.connect(ip, port, False)
+    except requests.exceptions.ConnectionError as err:
+        print(err, file=sys.stderr)
+        return 1
+
+    metric_names = pyKairosDB.metadata.get_all_metric_names(con)
+
+    filtered_metrics = []
+    for name in metric_names:
+        if metric_filter.search(name):
+            filtered_metrics.append(name)
+            if brief:
+                print(name)
+
+    if brief:
+        return 0
+
+    content = con.read_relative(filtered_metrics, (1, 'days'))
+
+    if outfile is not None:
+        with open(outfile, "wb") as file_handle:
+            pickle.dump(content, file_handle, pickle.HIGHEST_PROTOCOL)
+        print("Wrote results to \"" + outfile + "\"")
+    else:
+        pickle.dump(content, sys.stdout, pickle.HIGHEST_PROTOCOL)
+    return 0
+
+
+def parse(metric, infile="", graph=False):
+    """Print or plot the values of a metric from a pickled fetch result"""
+    import pyKairosDB
+
+    if infile:
+        with open(infile, "rb") as file_handle:
+            content = pickle.load(file_handle)
+    else:
+        content = pickle.load(sys.stdin)
+
+    result = pyKairosDB.util.get_content_values_by_name(content, metric)
+
+    if len(result) < 1:
+        print("Can't find any data for metric \"" + metric + "\"")
+        print("Did you mean any of these:")
+
+        results = pyKairosDB.util.content_by_name_substring(content, metric)
+        for result in results:
+            print("  " + result['name'])
+
+        return 1
+
+    data = result[0]['values']
+
+    if graph:
+        import matplotlib.pyplot as plt
+
+        x = []
+        y = []
+
+        for point in data:
+            x.append(point[0])
+            y.append(point[1])
+
+        plt.plot(x, y)
+        plt.title(metric)
+        plt.show()
+    else:
+        print(data)
+        print("")
+
+    times = [int(point[0] * 1000) for point in data]
+    period = max(times) - min(times) if times else 0
+
+    second, millisecond = divmod(period, 1000)
+    minute, second = divmod(second, 60)
+    hour, minute = divmod(minute, 60)
+    day, hour = divmod(hour, 24)
+
+    print("Read " + str(len(data)) + " datapoints for metric \"" + metric + "\"")
+    print("In a period of %d days %d hours %d minutes %d seconds %d millisecond" %
+          (day, hour, minute, second, millisecond))
+    return 0
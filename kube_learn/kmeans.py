@@ -0,0 +1,69 @@
+"""KMeans clustering of PCA reduced metrics"""
+from __future__ import absolute_import, print_function
+from pickle import load
+
+import matplotlib.pyplot as plt
+import numpy as np
+from sklearn.cluster import KMeans
+from sklearn.decomposition import PCA
+from sklearn.preprocessing import MinMaxScaler
+
+# Sample data and labels used when no input file is given
+SAMPLE_X = [[1], [0.9994394618834082], [0.9994363021420518], [0.9994435169727324], [0.9989067055393587], [1], [1], [1], [1], [1], [1], [0.9955599407992107], [0.9938335046248715], [0.9966471081307627], [0.9985412107950401], [0.9997293640054127], [1], [0.9996900185988841], [0.9995883079456567], [1], [1], [1], [1], [0.999485596707819], [1], [1], [1], [1], [1], [1], [1], [1], [1], [1], [1], [1], [1], [1], [1], [0.999721293199554], [0.9997066588442359], [0.9994347088750706], [1], [0.9951338199513382], [0.9962740633409232], [0.997649271274095], [0.9986191659762497], [0.9994361432196223], [0.9994370954123276]]
+SAMPLE_Y = [1, 1, 1, 0, 0, 0, 0, 0, 0, 0, 2, 2, 2, 1, 1, 1, 1, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 1, 1, 1, 1, 2, 2, 2, 1, 1, 1, 1]
+
+
+def main(input="", clusters=3):
+    """Cluster the pickled samples in input (the sample data if not given)
+    and plot the clusters and their decision boundaries"""
+    if input:
+        with open(input, "rb") as file_handle:
+            X = load(file_handle)
+        y = []
+    else:
+        X = SAMPLE_X
+        y = SAMPLE_Y
+
+    data = MinMaxScaler().fit_transform(X)
+
+    reduced_data = PCA(n_components=min(2, data.shape[1])).fit_transform(data)
+    if reduced_data.shape[1] == 1:
+        # Plot one dimensional data on a line
+        reduced_data = np.hstack([reduced_data, np.zeros_like(reduced_data)])
+
+    kmeans = KMeans(n_clusters=clusters).fit(reduced_data)
+    # Plot the decision boundary. For that, we will assign a color to each
+    x_min, x_max = reduced_data[:, 0].min() - 1, reduced_data[:, 0].max() + 1
+    y_min, y_max = reduced_data[:, 1].min() - 1, reduced_data[:, 1].max() + 1
+
+    h = 0.02
+
+    xx, yy = np.meshgrid(np.arange(x_min, x_max, h), np.arange(y_min, y_max, h))
+
+    # Obtain labels for each point in mesh. Use last trained model.
+    Z = kmeans.predict(np.c_[xx.ravel(), yy.ravel()])
+
+    # Put the result into a color plot
+    Z = Z.reshape(xx.shape)
+    plt.figure(1)
+    plt.clf()
+    plt.imshow(Z, interpolation='nearest',
+               extent=(xx.min(), xx.max(), yy.min(), yy.max()),
+               cmap=plt.cm.Paired,
+               aspect='auto', origin='lower')
+
+    colors = {0: "ro", 1: "go", 2: "bo"}
+    for i in range(len(reduced_data)):
+        color = colors.get(y[i], "ko") if i < len(y) else "ko"
+        plt.plot(reduced_data[i, 0], reduced_data[i, 1], color, markersize=4)
+    # Plot the centroids as a white X
+    centroids = kmeans.cluster_centers_
+    plt.scatter(centroids[:, 0], centroids[:, 1],
+                marker='x', s=169, linewidths=3,
+                color='w', zorder=10)
+    plt.xlim(x_min, x_max)
+    plt.ylim(y_min, y_max)
+    plt.xticks(())
+    plt.yticks(())
+    plt.show()
+    return 0
@@ -0,0 +1,665 @@
+"""luminol"""
+from __future__ import absolute_import, print_function
+import json
+import math
+import multiprocessing
+import numpy as np
+import pandas as pd
+from luminol import anomaly_detector as ad
+from luminol.constants import (ANOMALY_THRESHOLD, DEFAULT_SCORE_PERCENT_THRESHOLD, DEFAULT_NOISE_PCT_THRESHOLD,
+                               DEFAULT_EMA_SMOOTHING_FACTOR, DEFAULT_DERI_SMOOTHING_FACTOR,
+                               DEFAULT_DETECTOR_EMA_WEIGHT, DEFAULT_DETECTOR_EMA_SIGNIFICANT,
+                               DEFAULT_BITMAP_PRECISION, DEFAULT_BITMAP_CHUNK_SIZE)
+from luminol.modules.anomaly import Anomaly
+from luminol.modules.time_series import TimeSeries
+from kube_learn import influx_fetcher
+
+
+def read_csv(path):
+    """Read csv into a data frame"""
+    data = pd.read_csv(path,
+                       header=None,
+                       names=['ds', 'y'],
+                       index_col=0,
+                       parse_dates=True)
+    return data
+
+
+def prepare_data(data):
+    """Prepare the data"""
+    data = data.dropna()
+    return data
+
+
+def to_time_series(values, timestamps=None):
+    """Wrap the values in a luminol TimeSeries without going through a dict,
+    timestamps default to the positions of the values"""
+    series = TimeSeries({})
+    series.values = np.asarray(values, dtype=np.float64).tolist()
+    if timestamps is None:
+        series.timestamps = list(range(len(series.values)))
+    else:
+        series.timestamps = np.asarray(timestamps, dtype=np.int64).tolist()
+    return series
+
+
+def find_anomalies(data, timestamps=None):
+    """Run luminol and find anomalies"""
+    detector = ad.AnomalyDetector(to_time_series(data, timestamps),
+                                  algorithm_name='default_detector')
+    anomalies = detector.get_anomalies()
+    return anomalies
+
+
+# Matrix of find_anomalies_parallel, set before the workers are forked so
+# they read the columns from shared memory instead of a pickled copy
+_shared_matrix = {}
+
+
+def _detect_column(column):
+    """Score one column of the shared matrix"""
+    shape = _shared_matrix['shape']
+    matrix = np.frombuffer(_shared_matrix['buffer'], dtype=np.float64).reshape(shape)
+    timestamps = _shared_matrix['timestamps']
+    detector = ad.AnomalyDetector(to_time_series(matrix[column], timestamps),
+                                  algorithm_name='default_detector')
+    scores = detector.get_all_scores()
+    return (np.array(scores.timestamps, dtype=np.int64),
+            np.array(scores.values, dtype=np.float64),
+            get_anomaly_index(detector.get_anomalies()))
+
+
+def find_anomalies_parallel(matrix, feature_names, workers=None, timestamps=None):
+    """Run luminol on every column of matrix on a pool of workers. The matrix
+    is copied into shared memory once, feature-major so every column is one
+    contiguous block. Returns (feature, timestamps, scores, anomaly
+    timestamps) per column"""
+    matrix = np.asarray(matrix, dtype=np.float64)
+    rows, columns = matrix.shape
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+
+    buffer = multiprocessing.RawArray('d', rows * columns)
+    shared = np.frombuffer(buffer, dtype=np.float64).reshape(columns, rows)
+    shared[:] = matrix.T
+    _shared_matrix.update(buffer=buffer, shape=(columns, rows), timestamps=timestamps)
+
+    try:
+        if workers <= 1 or columns <= 1:
+            results = [_detect_column(column) for column in range(columns)]
+        else:
+            pool = multiprocessing.Pool(min(workers, columns))
+            try:
+                results = pool.map(_detect_column, range(columns), chunksize=1)
+                pool.close()
+            except:
+                pool.terminate()
+                raise
+            finally:
+                pool.join()
+    finally:
+        _shared_matrix.clear()
+
+    return [(feature_name,) + result for feature_name, result in zip(feature_names, results)]
+
+
+class RunningStd(object):
+    """Population standard deviation of the values added so far, like
+    numpy.std over all of them (Welford's update)"""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.squares = 0.0
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.squares += delta * (value - self.mean)
+
+    def std(self):
+        if self.count == 0:
+            return 0.0
+        return math.sqrt(max(self.squares, 0.0) / self.count)
+
+
+class OnlineDetector(object):
+    """Luminol's default detector updated one point at a time. It keeps the
+    exponential average of the values and of the absolute derivative, and
+    running standard deviations to normalize their deviations, so a point
+    costs O(1) however long the series is. Points must arrive in time order,
+    NaN values are skipped.
+
+    The batch detector normalizes and denoises with the standard deviation and
+    maximum of the whole series, here they are the ones seen so far, so
+    early scores differ and converge as the series grows. Anomalies are the
+    intervals above threshold like in the batch detector, the exact point is
+    the one the exponential average refinement picks, and they are reported
+    once the interval closes"""
+
+    algorithm_name = 'default_detector'
+
+    def __init__(self, threshold=ANOMALY_THRESHOLD['default_detector'],
+                 smoothing_factor=DEFAULT_EMA_SMOOTHING_FACTOR,
+                 derivative_smoothing_factor=DEFAULT_DERI_SMOOTHING_FACTOR,
+                 score_percent_threshold=DEFAULT_SCORE_PERCENT_THRESHOLD):
+        self.threshold = threshold
+        self.score_percent_threshold = score_percent_threshold
+        self.smoothing_factor = smoothing_factor
+        self.derivative_smoothing_factor = derivative_smoothing_factor
+        self.count = 0
+        self.max_score = 0.0
+        self.anomalies = []
+
+        # Exponential average of the values
+        self.ema = None
+        self.value_std = RunningStd()
+        self.max_ema_score = 0.0
+        # Exponential average of the absolute derivative
+        self.last_point = None
+        self.derivative_ema = None
+        self.derivative_std = RunningStd()
+        self.max_derivative_score = 0.0
+
+        # Open anomaly interval
+        self.start = None
+        self.end = None
+        self.interval_score = None
+        self.refine_ema = None
+        self.refine_deviation = None
+        self.exact_timestamp = None
+
+    def algorithm_params(self):
+        """Parameters for the batch AnomalyDetector to score the same way"""
+        return {}
+
+    def _score(self, timestamp, value):
+        """Scores the new point, returns the points that got their final
+        score as (timestamp, score) pairs"""
+        factor = self.smoothing_factor
+        self.ema = value if self.ema is None else factor * value + (1 - factor) * self.ema
+        self.value_std.add(value)
+        std = self.value_std.std()
+        ema_score = abs(value - self.ema)
+        if std:
+            ema_score /= std
+        self.max_ema_score = max(self.max_ema_score, ema_score)
+
+        # The first point gets the derivative of the second one, so both score 0
+        derivative_score = 0.0
+        if self.last_point is not None:
+            last_timestamp, last_value = self.last_point
+            delta = timestamp - last_timestamp
+            derivative = abs((value - last_value) / delta if delta != 0 else value - last_value)
+            if self.derivative_ema is None:
+                self.derivative_ema = derivative
+            else:
+                factor = self.derivative_smoothing_factor
+                self.derivative_ema = factor * derivative + (1 - factor) * self.derivative_ema
+            derivative_score = abs(derivative - self.derivative_ema)
+        self.last_point = (timestamp, value)
+        self.derivative_std.add(derivative_score)
+        std = self.derivative_std.std()
+        if std:
+            derivative_score /= std
+        self.max_derivative_score = max(self.max_derivative_score, derivative_score)
+
+        ema_score = denoise(ema_score, self.max_ema_score)
+        derivative_score = denoise(derivative_score, self.max_derivative_score)
+        weight = DEFAULT_DETECTOR_EMA_WEIGHT
+        score = max(ema_score, ema_score * weight + derivative_score * (1 - weight))
+        if ema_score > DEFAULT_DETECTOR_EMA_SIGNIFICANT:
+            score = max(score, derivative_score)
+        return [(timestamp, score)]
+
+    def _track(self, timestamp, score):
+        """Extends, opens or closes the anomaly interval with a final score"""
+        self.max_score = max(self.max_score, score)
+        if not self.max_score:
+            return
+        threshold = self.threshold or self.max_score * self.score_percent_threshold
+        if score <= threshold:
+            self.close()
+            return
+
+        factor = DEFAULT_EMA_SMOOTHING_FACTOR
+        if self.start is None:
+            self.start = timestamp
+            self.interval_score = score
+            self.refine_ema = score
+        else:
+            self.interval_score = max(self.interval_score, score)
+            self.refine_ema = factor * score + (1 - factor) * self.refine_ema
+        self.end = timestamp
+        deviation = abs(score - self.refine_ema)
+        if self.refine_deviation is None or deviation > self.refine_deviation:
+            self.refine_deviation = deviation
+            self.exact_timestamp = timestamp
+
+    def update(self, timestamp, value):
+        """Adds one point, returns the points that got their final score as
+        (timestamp, score) pairs"""
+        if value is None or math.isnan(value):
+            return []
+        scored = self._score(timestamp, float(value))
+        self.count += 1
+        for scored_timestamp, score in scored:
+            self._track(scored_timestamp, score)
+        return scored
+
+    def extend(self, timestamps, values):
+        """Adds the points in order, returns the timestamps and scores of the
+        points that got their final score"""
+        scored = []
+        for timestamp, value in zip(timestamps, values):
+            scored += self.update(timestamp, value)
+        return (np.array([timestamp for timestamp, _ in scored], dtype=np.int64),
+                np.array([score for _, score in scored], dtype=np.float64))
+
+    def close(self):
+        """Ends the open anomaly interval, like the end of the series does in
+        the batch detector"""
+        if self.start is not None:
+            self.anomalies.append(Anomaly(self.start, self.end, self.interval_score, self.exact_timestamp))
+        self.start = None
+        self.end = None
+        self.interval_score = None
+        self.refine_ema = None
+        self.refine_deviation = None
+        self.exact_timestamp = None
+
+    def pop_anomalies(self):
+        """The anomalies closed since the last call"""
+        anomalies = self.anomalies
+        self.anomalies = []
+        return anomalies
+
+
+class OnlineBitmapDetector(OnlineDetector):
+    """Luminol's bitmap detector updated one point at a time. Values are
+    turned into SAX symbols and the chunk counts of the lagging and the
+    future window next to a point are kept as one dict of their differences,
+    so the score, the sum of the squared differences, changes in O(1) when the
+    windows slide. A point is scored once its future window is complete, so
+    scores lag future_window_size points behind.
+
+    The batch detector cuts the value range of the whole series into the
+    symbols, here it is value_range or else the range seen so far. With
+    value_range set to the range of the series the scores before denoising
+    are the batch scores. Without a threshold, anomalies are the points above
+    score_percent_threshold of the largest score so far"""
+
+    algorithm_name = 'bitmap_detector'
+
+    def __init__(self, lag_window_size=100, future_window_size=100, precision=DEFAULT_BITMAP_PRECISION,
+                 chunk_size=DEFAULT_BITMAP_CHUNK_SIZE, value_range=None, threshold=None,
+                 score_percent_threshold=DEFAULT_SCORE_PERCENT_THRESHOLD):
+        super(OnlineBitmapDetector, self).__init__(threshold, score_percent_threshold=score_percent_threshold)
+        if chunk_size > min(lag_window_size, future_window_size):
+            raise ValueError("chunk_size can't be larger than the windows")
+        self.lag_window_size = lag_window_size
+        self.future_window_size = future_window_size
+        self.precision = precision
+        self.chunk_size = chunk_size
+        self.value_range = value_range
+        self.min_value = None
+        self.max_value = None
+        # Rings of the last symbols, chunks and timestamps by point index
+        self.size = lag_window_size + future_window_size + 1
+        self.symbols = [None] * self.size
+        self.chunks = [None] * self.size
+        self.timestamps = [None] * self.size
+        # Future minus lagging window count of every chunk, and their sum of squares
+        self.differences = {}
+        self.bitmap_score = 0
+        self.max_bitmap_score = 0
+
+    def algorithm_params(self):
+        return {'lag_window_size': self.lag_window_size, 'future_window_size': self.future_window_size,
+                'precision': self.precision, 'chunk_size': self.chunk_size}
+
+    def _symbol(self, value):
+        if self.value_range is not None:
+            low, high = self.value_range
+        else:
+            self.min_value = value if self.min_value is None else min(self.min_value, value)
+            self.max_value = value if self.max_value is None else max(self.max_value, value)
+            low, high = self.min_value, self.max_value
+        height = (high - low) / float(self.precision)
+        symbol = 0
+        for section in range(self.precision):
+            if value >= low + section * height:
+                symbol = section
+            else:
+                break
+        return symbol
+
+    def _count(self, start, change):
+        """Changes the difference of the chunk starting at point start"""
+        if start < 0:
+            return
+        chunk = self.chunks[start % self.size]
+        difference = self.differences.get(chunk, 0)
+        self.bitmap_score += 2 * difference * change + 1
+        self.differences[chunk] = difference + change
+
+    def _score(self, timestamp, value):
+        index = self.count
+        self.symbols[index % self.size] = self._symbol(value)
+        self.timestamps[index % self.size] = timestamp
+        start = index + 1 - self.chunk_size
+        if start >= 0:
+            self.chunks[start % self.size] = tuple(self.symbols[i % self.size] for i in range(start, index + 1))
+
+        # Slide both windows to the point whose future window just filled up
+        point = index + 1 - self.future_window_size
+        self._count(start, 1)
+        self._count(point - 1, -1)
+        self._count(point - self.chunk_size, -1)
+        self._count(point - 1 - self.lag_window_size, 1)
+        if point < 0:
+            return []
+
+        score = self.bitmap_score if point >= self.lag_window_size else 0
+        self.max_bitmap_score = max(self.max_bitmap_score, score)
+        return [(self.timestamps[point % self.size], denoise(score, self.max_bitmap_score))]
+
+
+def denoise(score, max_score):
+    """Luminol's denoising: scores below a small share of the largest score
+    are 0"""
+    if max_score and score < DEFAULT_NOISE_PCT_THRESHOLD * max_score:
+        return 0
+    return score
+
+
+def stream_anomalies(batches, detectors=None, detector=OnlineDetector, close=True):
+    """Runs an online detector per feature over batches in the shape of
+    influx_fetcher.iter_metrics: dicts with the rows of 'data', their 'times'
+    and the 'feature_names'. Yields (feature, timestamps, scores, anomaly
+    timestamps) per feature and batch, as soon as the batch is scored.
+    detectors maps features to their detectors, new features get one from
+    detector. With close set, the open anomalies are closed and yielded after
+    the last batch"""
+    if detectors is None:
+        detectors = {}
+    for batch in batches:
+        data = np.asarray(batch['data'], dtype=np.float64)
+        for column, feature_name in enumerate(batch['feature_names']):
+            if feature_name not in detectors:
+                detectors[feature_name] = detector()
+            timestamps, scores = detectors[feature_name].extend(batch['times'], data[:, column])
+            anomalies = get_anomaly_index(detectors[feature_name].pop_anomalies())
+            yield feature_name, timestamps, scores, anomalies
+    if close:
+        for feature_name, feature_detector in detectors.items():
+            feature_detector.close()
+            anomalies = get_anomaly_index(feature_detector.pop_anomalies())
+            yield (feature_name, np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64), anomalies)
+
+
+def compare_to_batch(values, timestamps=None, detector=None):
+    """Runs an online detector and the batch detector it follows over the
+    same series. Returns the scores of both for the points the online
+    detector scored, their correlation and the exact timestamps of the
+    anomalies of both"""
+    if detector is None:
+        detector = OnlineDetector()
+    values = np.asarray(values, dtype=np.float64)
+    if timestamps is None:
+        timestamps = np.arange(len(values))
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    keep = ~np.isnan(values)
+    values, timestamps = values[keep], timestamps[keep]
+
+    online_timestamps, online_scores = detector.extend(timestamps, values)
+    detector.close()
+
+    batch = ad.AnomalyDetector(to_time_series(values, timestamps), algorithm_name=detector.algorithm_name,
+                               algorithm_params=detector.algorithm_params(), score_threshold=detector.threshold)
+    batch_scores = batch.get_all_scores()
+    batch_scores = pd.Series(batch_scores.values, index=batch_scores.timestamps).reindex(online_timestamps).values
+
+    correlation = None
+    if len(online_scores) > 1 and online_scores.std() and batch_scores.std():
+        correlation = np.corrcoef(online_scores, batch_scores)[0, 1]
+    return {
+        'timestamps': online_timestamps,
+        'online_scores': online_scores,
+        'batch_scores': batch_scores,
+        'correlation': correlation,
+        'online_anomalies': get_anomaly_index(detector.pop_anomalies()),
+        'batch_anomalies': get_anomaly_index(batch.get_anomalies())
+    }
+
+
+def get_anomaly_index(anomalies):
+    """Return indexes for luminol anomalies"""
+    points = []
+    for anomaly in anomalies:
+        points.append(anomaly.exact_timestamp)
+    return points
+
+
+def influx_to_dataframe(data):
+    """Converts influxdb metrics to a pandas dataframe, columnar results are
+    wrapped without copying the data matrix"""
+    if isinstance(data['data'], np.ndarray):
+        return pd.DataFrame(data=data['data'],
+                            index=pd.to_datetime(data['times'], unit='s'),
+                            columns=data['feature_names'],
+                            copy=False)
+    data = pd.DataFrame(data=data['data'],
+                        index=data['times'],
+                        columns=data['feature_names'])
+    return data
+
+
+class PCAReducer(object):
+    """Reduces standardized features to the fewest principal components that
+    explain variance of their variance. Batches are fitted with randomized PCA,
+    the number of components is doubled until the target is reached. With
+    incremental set, chunks are fitted one at a time with partial_fit using
+    IncrementalPCA, which keeps max_components (all features by default) and
+    uses the first ones that reach the target, fit then goes through
+    partial_fit in chunks of batch_size rows. The loadings map components back
+    to features"""
+
+    def __init__(self, variance=0.9, max_components=None, incremental=False, random_state=0, batch_size=1000):
+        if not 0 < variance <= 1:
+            raise ValueError("variance must be in (0, 1]")
+        self.variance = variance
+        self.max_components = max_components
+        self.incremental = incremental
+        self.random_state = random_state
+        self.batch_size = batch_size
+        self.scaler = None
+        self.pca = None
+        self.n_components = None
+        self.feature_names = None
+        self.pending = []
+
+    def _select(self):
+        cumulative = np.cumsum(self.pca.explained_variance_ratio_)
+        self.n_components = int(min(np.searchsorted(cumulative, self.variance - 1e-12) + 1, len(cumulative)))
+
+    def fit(self, data):
+        if self.incremental:
+            return self._fit_chunks(data)
+
+        from sklearn.decomposition import PCA
+        from sklearn.preprocessing import StandardScaler
+
+        self.feature_names = list(data.columns)
+        self.scaler = StandardScaler()
+        matrix = self.scaler.fit_transform(np.asarray(data, dtype=np.float64))
+
+        limit = min(matrix.shape)
+        if self.max_components:
+            limit = min(limit, self.max_components)
+        components = min(limit, 8)
+        while True:
+            solver = 'randomized' if components < limit else 'full'
+            self.pca = PCA(n_components=components, svd_solver=solver, random_state=self.random_state)
+            self.pca.fit(matrix)
+            if components >= limit or self.pca.explained_variance_ratio_.sum() >= self.variance:
+                break
+            components = min(components * 2, limit)
+
+        self._select()
+        return self
+
+    def _components(self, features):
+        if self.max_components:
+            return min(features, self.max_components)
+        return features
+
+    def _fit_chunks(self, data):
+        """Fit from scratch with partial_fit, the last chunk is merged into
+        the one before if it has fewer rows than components. With fewer rows
+        than components in all, as many components as rows are kept"""
+        self.pca = None
+        self.pending = []
+        components = self._components(data.shape[1])
+        batch_size = max(self.batch_size, components)
+        starts = list(range(0, len(data), batch_size))
+        if len(starts) > 1 and len(data) - starts[-1] < components:
+            starts.pop()
+        for start, stop in zip(starts, starts[1:] + [len(data)]):
+            self.partial_fit(data.iloc[start:stop])
+        if self.pca is None and self.pending:
+            self._fit_pending(len(data))
+        return self
+
+    def partial_fit(self, data):
+        """Update the reduction with a chunk of rows. IncrementalPCA needs at
+        least as many rows as components in every batch, so rows are buffered
+        in pending until enough have arrived and a short chunk is fitted
+        together with the ones after it"""
+        matrix = np.asarray(data, dtype=np.float64)
+        if self.pca is None and not self.pending:
+            self.feature_names = list(data.columns)
+        self.pending.append(matrix)
+        if sum(len(chunk) for chunk in self.pending) >= self._components(matrix.shape[1]):
+            self._fit_pending()
+        return self
+
+    def _fit_pending(self, components=None):
+        """Fit the buffered rows, creating the IncrementalPCA with components
+        (by default all features up to max_components) on the first call"""
+        from sklearn.decomposition import IncrementalPCA
+        from sklearn.preprocessing import StandardScaler
+
+        matrix = np.concatenate(self.pending)
+        self.pending = []
+        if self.pca is None:
+            self.scaler = StandardScaler()
+            self.pca = IncrementalPCA(n_components=min(components or matrix.shape[1],
+                                                       self._components(matrix.shape[1])))
+
+        self.scaler.partial_fit(matrix)
+        self.pca.partial_fit(self.scaler.transform(matrix))
+        self._select()
+
+    def transform(self, data):
+        """The kept components of data as a data frame with the columns pc0,
+        pc1, ... and the index of data"""
+        matrix = self.scaler.transform(np.asarray(data, dtype=np.float64))
+        reduced = self.pca.transform(matrix)[:, :self.n_components]
+        return pd.DataFrame(reduced, index=data.index, columns=self.component_names)
+
+    @property
+    def component_names(self):
+        return ['pc%d' % component for component in range(self.n_components)]
+
+    @property
+    def loadings(self):
+        """Weight of every feature (columns) in every kept component (rows)"""
+        return pd.DataFrame(self.pca.components_[:self.n_components],
+                            index=self.component_names, columns=self.feature_names)
+
+    def contributors(self, component, top=3):
+        """The top features of a component by absolute loading, as (feature,
+        loading) pairs"""
+        weights = self.loadings.loc[component]
+        order = np.argsort(-np.abs(weights.values))[:top]
+        return [(weights.index[i], weights.values[i]) for i in order]
+
+
+def pca_reduce(data, variance=0.9, max_components=None):
+    """Reduce the features of data to the principal components explaining
+    variance of their variance. Returns the components and the fitted
+    PCAReducer"""
+    reducer = PCAReducer(variance, max_components).fit(data)
+    return reducer.transform(data), reducer
+
+
+def stream(config_path='metrics.json', ip='212.32.186.86', follow=False, batch=1000):
+    """Read metrics from influx batch by batch and print the anomalies of
+    every feature as the online detector finds them. With follow set, keeps
+    polling for new intervals instead of stopping at the stop time"""
+    conf = influx_fetcher.InfluxConfig(ip=ip)
+    with open(config_path) as file_handle:
+        query = json.load(file_handle)
+    if follow:
+        batches = influx_fetcher.MetricFollower(query, conf).follow_batches()
+    else:
+        batches = influx_fetcher.iter_metrics(query, conf, batch)
+
+    for feature_name, _, _, anomalies in stream_anomalies(batches):
+        for timestamp in anomalies:
+            print(feature_name, "anomaly at", pd.to_datetime(timestamp, unit='s'))
+
+
+def main(config_path='metrics.json', ip='212.32.186.86', workers=1, variance=0.9):
+    """Read metrics from influx and plot anomalies using luminol. The
+    detector runs on the principal components explaining variance of the
+    variance, spread over workers processes, anomalies are drawn on the
+    feature contributing most to their component"""
+    import matplotlib.pyplot as plt
+
+    # Get metrics from influx
+    conf = influx_fetcher.InfluxConfig(ip=ip)
+    with open(config_path) as file_handle:
+        query = json.load(file_handle)
+    result = influx_fetcher.get_metrics(query, conf, columnar=True)
+
+    # Prepare data, the epoch times become the datetime index the plot uses
+    data = influx_to_dataframe(result)
+    data = prepare_data(data)
+
+    # Process data using PCA
+    reduced, reducer = pca_reduce(data, variance)
+    print("Reduced %d features to %d components" % (data.shape[1], reducer.n_components))
+
+    # Find anomalies, mapped back to the features of their components
+    results = find_anomalies_parallel(reduced.values, reduced.columns, workers)
+    anomaly_coordinates = []
+    for component, _, _, indexes in results:
+        contributors = reducer.contributors(component)
+        print(component, "anomalies at", indexes, "driven by", [feature for feature, _ in contributors])
+        anomaly_coordinates.append((contributors[0][0], indexes))
+
+    # Plot the metrics
+    data.plot()
+
+    # Plot the anomalies, indexes are positions in the rows that are left after prepare_data
+    print(anomaly_coordinates)
+    for anomaly in anomaly_coordinates:
+        feature_name = anomaly[0]
+        indexes = anomaly[1]
+        xcoords = data.index[indexes]
+        ycoords = data[feature_name].values[indexes]
+        plt.scatter(xcoords, ycoords, c='r')
+
+    # # Determine correlations of anomalous time series
+    # if anomalies:
+    #     time_period = anomalies[0].get_time_window()
+    #     correlator = luminol.correlator.Correlator(ts, ts2, time_period)
+
+    # # Print correlation
+    # print(correlator.get_correlation_result().coefficient)
+    
+    # Display the plot with metrics and anomalies
+    plt.show()
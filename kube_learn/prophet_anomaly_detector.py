@@ -0,0 +1,801 @@
+import pandas as pd
+from pandas.tseries.frequencies import to_offset
+import numpy as np
+from fbprophet import Prophet
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import timedelta
+import hashlib
+import importlib
+import json
+import multiprocessing
+import os
+import pickle
+import resource
+import time
+import math
+
+# workalendar calendar of the non-workdays, as "<module>.<class>" in workalendar
+CALENDAR = "europe.Sweden"
+
+# Non-workdays per calendar and year, saved to CALENDAR_CACHE so other
+# processes don't build them again
+_non_workday_cache = {}
+CALENDAR_CACHE = os.path.join("~", ".cache", "kube-learn", "calendars")
+
+WEEKEND_HOURS = ["weekend_hour{}".format(h) for h in range(0, 24)]
+
+# Regressors of recently used timestamps, keyed by their fingerprint, least
+# recently used first. Holds at least WEEKEND_HOUR_CACHE_SIZE entries, more
+# after reserve_weekend_hour_cache
+_weekend_hour_cache = OrderedDict()
+WEEKEND_HOUR_CACHE_SIZE = 16
+_weekend_hour_cache_size = WEEKEND_HOUR_CACHE_SIZE
+
+# Frames every series encodes the regressors of: the training data of the
+# data and std-dev models and their futures
+FRAMES_PER_SERIES = 4
+
+def weekend_hour(ds, h):
+    """Indicator function for weekend hour h."""
+    date = pd.to_datetime(ds)
+    if date.hour == h and (date.weekday() == 5 or date.weekday() == 6):
+        return 1
+    else:
+        return 0
+
+def weekend_hour_regressors(ds):
+    """One-hot encoding of the weekend hour of every timestamp in ds, as a
+    data frame with the columns weekend_hour0 to weekend_hour23 and the index
+    of ds. Results are cached per timestamp range, the least recently used
+    range is evicted when the cache is full."""
+    dates = pd.DatetimeIndex(ds)
+    values = dates.asi8
+    key = (len(values), hashlib.md5(values.tobytes()).hexdigest())
+
+    regressors = _weekend_hour_cache.pop(key, None)
+    if regressors is None:
+        weekend = dates.weekday >= 5
+        regressors = np.zeros((len(dates), 24), dtype=np.int64)
+        regressors[np.flatnonzero(weekend), dates.hour[weekend]] = 1
+        while len(_weekend_hour_cache) >= _weekend_hour_cache_size:
+            _weekend_hour_cache.popitem(last=False)
+    _weekend_hour_cache[key] = regressors
+
+    index = ds.index if isinstance(ds, pd.Series) else dates
+    return pd.DataFrame(regressors, index=index, columns=WEEKEND_HOURS, copy=True)
+
+def reserve_weekend_hour_cache(entries):
+    """Grow the regressor cache to hold at least entries timestamp ranges."""
+    global _weekend_hour_cache_size
+    _weekend_hour_cache_size = max(_weekend_hour_cache_size, entries)
+
+def add_weekend_hours(df):
+    """Set the weekend hour regressors of df from its ds column."""
+    regressors = weekend_hour_regressors(df["ds"])
+    for column in WEEKEND_HOURS:
+        df[column] = regressors[column].values
+    return df
+
+def get_calendar(calendar=CALENDAR):
+    """The workalendar calendar named "<module>.<class>", e.g. "usa.California"."""
+    module, name = calendar.rsplit(".", 1)
+    return getattr(importlib.import_module("workalendar." + module), name)()
+
+def read_calendar_cache(calendar):
+    try:
+        with open(os.path.join(os.path.expanduser(CALENDAR_CACHE), calendar + ".json")) as file_handle:
+            return json.load(file_handle)
+    except (IOError, ValueError):
+        return {}
+
+def write_calendar_cache(calendar, years):
+    path = os.path.expanduser(CALENDAR_CACHE)
+    try:
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        temp_path = os.path.join(path, "{}.json.{}.tmp".format(calendar, os.getpid()))
+        with open(temp_path, "w") as file_handle:
+            json.dump(years, file_handle)
+        os.rename(temp_path, os.path.join(path, calendar + ".json"))
+    except (IOError, OSError):
+        pass
+
+def non_workday_table(first_year, last_year, calendar=CALENDAR):
+    """Sorted datetime64[D] array of the weekends and holidays of calendar in
+    the years first_year to last_year. Years are built once per calendar and
+    cached in memory and in CALENDAR_CACHE."""
+    years = [year for year in range(first_year, last_year + 1) if (calendar, year) not in _non_workday_cache]
+    if years:
+        stored = read_calendar_cache(calendar)
+        missing = [year for year in years if str(year) not in stored]
+        if missing:
+            cal = get_calendar(calendar)
+            weekend_days = list(cal.get_weekend_days())
+            for year in missing:
+                days = pd.date_range("{}-01-01".format(year), "{}-12-31".format(year), freq="D")
+                holidays = pd.DatetimeIndex([day for day, _ in cal.holidays(year)])
+                non_workdays = days[np.isin(days.weekday, weekend_days) | days.isin(holidays)]
+                stored[str(year)] = [str(day.date()) for day in non_workdays]
+            write_calendar_cache(calendar, stored)
+        for year in years:
+            _non_workday_cache[(calendar, year)] = np.array(stored[str(year)], dtype="datetime64[D]")
+
+    return np.concatenate([_non_workday_cache[(calendar, year)] for year in range(first_year, last_year + 1)])
+
+def get_non_workdays(start, end, calendar=CALENDAR):
+    """Constructs a dataframe with non workdays in the column ds."""
+    start = pd.Timestamp(start)
+    end = pd.Timestamp(end)
+    table = non_workday_table(start.year, end.year, calendar)
+    dates = table[(table >= np.datetime64(start.date())) & (table <= np.datetime64(end.date()))]
+    datelist = pd.DatetimeIndex(dates.astype("datetime64[ns]"))
+    non_workdays = pd.DataFrame({"ds": datelist}, index=datelist)
+
+    return non_workdays
+
+def generate_holidays(df, periods, freq, calendar=CALENDAR):
+    """Generate non-workdays for all dates in df.index + periods * freq after."""
+    start = df.index[0].date()
+    future = pd.period_range(df.index[-1].date(), periods=periods, freq=freq)
+    end = future.to_timestamp()[-1].date()
+    non_workdays = get_non_workdays(start, end, calendar)
+
+    holidays = pd.DataFrame({
+        'holiday': 'non-workday',
+        'ds': non_workdays["ds"],
+        'lower_window': 0,
+        'upper_window': 0,
+    })
+
+    return holidays
+
+def build_model(df, holidays):
+    """Initialize the Prophet model with data about holidays and extra regressors."""
+
+    m = Prophet(holidays=holidays, yearly_seasonality=False)
+
+    # Create regressors for all weekend hours
+    add_weekend_hours(df)
+    for column in WEEKEND_HOURS:
+        m.add_regressor(column)
+
+    return m, df
+
+def build_future(m, periods, freq):
+    """Create data frame for <periods> * <freq> into the future"""
+    future = m.make_future_dataframe(periods=periods, freq=freq, include_history=True)
+    # All additional regressors must also be added to the future points.
+    add_weekend_hours(future)
+
+    return future
+
+def future_dates(ds, periods, freq):
+    """The times of build_future for a model fitted on ds, without fitting
+    it: the sorted training times and <periods> * <freq> after the last."""
+    dates = pd.DatetimeIndex(ds).unique().sort_values()
+    future = pd.date_range(start=dates[-1], periods=periods + 1, freq=freq)
+    return dates.append(future[future > dates[-1]][:periods])
+
+class ModelStore:
+    """Fitted models saved per series and kind ("data" or "std_dev") together
+    with the fingerprint of the data they were trained on."""
+
+    def __init__(self, path=os.path.join("~", ".cache", "kube-learn", "models")):
+        self.path = os.path.expanduser(path)
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+
+    def get_path(self, series, kind):
+        key = hashlib.sha1(str(series).encode("utf-8")).hexdigest()
+        return os.path.join(self.path, "{}-{}.pkl".format(key, kind))
+
+    def fingerprint(self, df, holidays):
+        """Fingerprint of the training data and holidays of a model."""
+        digest = hashlib.md5()
+        digest.update(pd.DatetimeIndex(df["ds"]).asi8.tobytes())
+        digest.update(np.asarray(df["y"], dtype=np.float64).tobytes())
+        if holidays is not None:
+            digest.update(pd.DatetimeIndex(holidays["ds"]).asi8.tobytes())
+        return digest.hexdigest()
+
+    def load(self, series, kind):
+        """Returns the stored (fingerprint, model) or None."""
+        try:
+            with open(self.get_path(series, kind), "rb") as file_handle:
+                entry = pickle.load(file_handle)
+        except (IOError, EOFError, pickle.UnpicklingError):
+            return None
+        return entry["fingerprint"], entry["model"]
+
+    def store(self, series, kind, fingerprint, model):
+        # Written to a temporary file first so concurrent workers never read a partial model
+        path = self.get_path(series, kind)
+        temp_path = "{}.{}.tmp".format(path, os.getpid())
+        with open(temp_path, "wb") as file_handle:
+            pickle.dump({"fingerprint": fingerprint, "model": model}, file_handle, pickle.HIGHEST_PROTOCOL)
+        os.rename(temp_path, path)
+
+def warm_start_params(m):
+    """Parameters of a fitted model as initial values for a new fit."""
+    return {
+        "k": np.ravel(m.params["k"])[0],
+        "m": np.ravel(m.params["m"])[0],
+        "sigma_obs": np.ravel(m.params["sigma_obs"])[0],
+        "delta": np.ravel(m.params["delta"]),
+        "beta": np.ravel(m.params["beta"]),
+    }
+
+def fit_model(df, holidays, store=None, series=None, kind="data"):
+    """Build and fit a model on df. With a store, the model stored for series
+    is returned if it was trained on the same data, otherwise the new fit
+    starts from its parameters."""
+    model, new_df = build_model(df, holidays)
+    if store is None or series is None:
+        model.fit(new_df)
+        return model
+
+    fingerprint = store.fingerprint(new_df, holidays)
+    stored = store.load(series, kind)
+    if stored is not None and stored[0] == fingerprint:
+        return stored[1]
+
+    if stored is not None:
+        try:
+            model.fit(new_df, init=warm_start_params(stored[1]))
+        except (RuntimeError, ValueError):
+            # The shape of the parameters changed, e.g. with a new holiday
+            model, new_df = build_model(df, holidays)
+            model.fit(new_df)
+    else:
+        model.fit(new_df)
+
+    store.store(series, kind, fingerprint, model)
+    return model
+
+def get_prediction(m, future):
+    """Get a prediction for the specified future."""
+    forecast = m.predict(future)
+    return forecast.set_index("ds")
+
+def get_residual(data, forecast):
+    """Calculate residual of data when removing everything explained by the model."""
+    return (data["y"] - forecast["yhat"])
+
+def plot_trend_residual(x_points, y_points_lower, y_points_upper, color='b', alpha=1):
+    import matplotlib.pyplot as plt
+
+    x = x_points[:]
+    x_points.reverse()
+    x += x_points
+
+    y_points_upper.reverse()
+    y = y_points_lower + y_points_upper
+    plt.fill(x, y, color=color, alpha=alpha)
+
+def get_std_dev(data, delta=timedelta(hours=6)):
+    """Standard deviation of y in consecutive windows of delta. A window
+    starts with the point after the last one and ends with the first point at
+    least delta after the end of the last window, every point gets the
+    standard deviation of its window. data must be sorted by ds. delta can be
+    a list of windows, then a dict of the results by window is returned."""
+    if isinstance(delta, (list, tuple)):
+        times = pd.DatetimeIndex(data["ds"])
+        values = np.asarray(data["y"], dtype=np.float64)
+        return dict((window, _windowed_std_dev(times, values, window)) for window in delta)
+
+    return _windowed_std_dev(pd.DatetimeIndex(data["ds"]), np.asarray(data["y"], dtype=np.float64), delta)
+
+def resample_std_dev(std_devs, std_dev_smoothing="1H"):
+    """Mean of the standard deviations per std_dev_smoothing interval, the
+    training data of the std-dev model."""
+    std_devs = std_devs.resample(std_dev_smoothing, label='right').mean()
+    std_devs["ds"] = std_devs.index
+    return std_devs
+
+def _window_ends(times, delta):
+    """End (exclusive) of every window of get_std_dev in the int64 times."""
+    ends = []
+    start = 0
+    current_time = times[0]
+    while start < len(times):
+        end = max(np.searchsorted(times, current_time + delta, 'left'), start)
+        if end >= len(times):
+            break
+        ends.append(end + 1)
+        current_time = times[end]
+        start = end + 1
+    return ends
+
+def _windowed_std_dev(times, values, delta):
+    if len(times) == 0:
+        return pd.DataFrame({"y": [], "ds": []}, columns=["y", "ds"])
+
+    ends = _window_ends(times.asi8, pd.Timedelta(delta).value)
+    starts = np.array([0] + [end for end in ends if end < len(values)], dtype=np.int64)
+    counts = np.diff(np.append(starts, len(values)))
+
+    means = np.add.reduceat(values, starts) / counts
+    deviations = values - np.repeat(means, counts)
+    std_devs = np.sqrt(np.add.reduceat(deviations * deviations, starts) / counts)
+
+    std_dev_df = pd.DataFrame(data=np.repeat(std_devs, counts),
+                              index=times.rename(None),
+                              columns=['y'])
+    std_dev_df["ds"] = std_dev_df.index
+    return std_dev_df
+
+def smooth_std_dev(std_dev, smooth_window = timedelta(hours=3)):
+    """Centered moving average of the y column of std_dev. The window holds
+    half the number of points in the first smooth_window before and after each
+    point and is cut at the edges. smooth_window can be a list of windows,
+    then a dict of the results by window is returned."""
+    values = std_dev["y"].values.astype(np.float64)
+
+    # Cumulative sums of the values and of the NaNs, a window with a NaN is NaN
+    missing = np.isnan(values)
+    sums = np.concatenate([[0.0], np.cumsum(np.where(missing, 0.0, values))])
+    nans = np.concatenate([[0], np.cumsum(missing)])
+
+    def smooth(window):
+        start = std_dev.index[0]
+        stop = start + window
+        smooth_count = len(std_dev.loc[(std_dev.index >= start) & (std_dev.index <= stop)])
+        half = smooth_count // 2
+        if half == 0:
+            raise ValueError("smooth_window {} holds less than two points".format(window))
+
+        positions = np.arange(len(values))
+        lower = np.maximum(positions - half, 0)
+        upper = np.minimum(positions + half, len(values))
+        mean_std_dev = (sums[upper] - sums[lower]) / (upper - lower)
+        mean_std_dev[nans[upper] > nans[lower]] = np.nan
+
+        new_std_dev = std_dev.copy()
+        new_std_dev["y"] = mean_std_dev
+        return new_std_dev
+
+    if isinstance(smooth_window, (list, tuple)):
+        return dict((window, smooth(window)) for window in smooth_window)
+    return smooth(smooth_window)
+
+def anomaly_mask(values, max_values, window_size, dev_multiplier=1.5, percent_true=1):
+    """Array form of get_anomalies. Returns a boolean mask of the values that
+    are anomalies: values above max_values * dev_multiplier in a window of
+    window_size points where at least percent_true of the points are, and
+    all values above four times that."""
+    values = np.abs(np.asarray(values, dtype=np.float64))
+    max_values = np.asarray(max_values, dtype=np.float64)
+    positions = len(values) - window_size + 1
+    if positions <= 0:
+        return np.zeros(len(values), dtype=bool)
+
+    with np.errstate(invalid='ignore'):
+        is_anomaly = values > max_values * dev_multiplier
+        is_extreme_anomaly = values > max_values * dev_multiplier * 4
+
+    # Rolling count of anomalies in the window starting at every position
+    counts = np.concatenate([[0], np.cumsum(is_anomaly)])
+    enough = counts[window_size:] - counts[:positions] >= math.ceil(window_size * percent_true)
+
+    # A point is in an accepted window if one starts between window_size - 1
+    # points before it and itself
+    accepted = np.concatenate([[0], np.cumsum(enough)])
+    points = np.arange(len(values))
+    first = np.clip(points - window_size + 1, 0, positions)
+    last = np.clip(points + 1, 0, positions)
+    in_window = accepted[last] > accepted[first]
+
+    # Every point is in a window, so extreme anomalies are always kept
+    return (is_anomaly & in_window) | is_extreme_anomaly
+
+def get_anomalies(dev_forecast, residual, dev_multiplier=1.5, window_delta=timedelta(hours = 4), percent_true=1):
+    """Sorted list of the (time, value) of the anomalies in residual, see
+    anomaly_mask. The window holds the number of points in the first
+    window_delta of dev_forecast."""
+    start = dev_forecast.index[0]
+    stop = start + window_delta
+    window_size = len(dev_forecast.loc[(dev_forecast.index >= start) & (dev_forecast.index <= stop)])
+
+    max_values = dev_forecast["yhat"].reindex(residual.index).values
+    mask = anomaly_mask(residual.values, max_values, window_size, dev_multiplier, percent_true)
+
+    return sorted(set(zip(residual.index[mask], residual.values[mask])))
+
+class AnomalyResult:
+    """Result of calculate_anomalies: the residual of the data, the std-dev
+    band, the point anomalies as (time, residual) and the intervals of
+    anomalies at most two data steps apart. Nothing is drawn until plot is
+    called. error is set instead when the series failed."""
+
+    def __init__(self, data, forecast, forecast_std_dev, anomalies, dev_multiplier=1.5, timings=None, error=None):
+        self.data = data
+        self.forecast = forecast
+        self.forecast_std_dev = forecast_std_dev
+        self.anomalies = anomalies
+        self.dev_multiplier = dev_multiplier
+        self.timings = timings if timings is not None else {}
+        self.error = error
+
+        if data is not None:
+            self.residual = get_residual(data, forecast)
+            self.band = forecast_std_dev["yhat"]
+        else:
+            self.residual = None
+            self.band = None
+        self.intervals = self.get_intervals()
+
+    @classmethod
+    def failed(cls, error, timings=None):
+        return cls(None, None, None, None, timings=timings, error=error)
+
+    @property
+    def upper(self):
+        return self.dev_multiplier * self.band
+
+    @property
+    def lower(self):
+        return -self.dev_multiplier * self.band
+
+    @property
+    def anomaly_times(self):
+        return pd.DatetimeIndex([anom_time for anom_time, _ in self.anomalies or []])
+
+    @property
+    def anomaly_values(self):
+        return np.array([value for _, value in self.anomalies or []], dtype=np.float64)
+
+    def get_intervals(self):
+        """(start, stop) of every run of anomalies without a gap of more than
+        two data steps."""
+        times = self.anomaly_times
+        if len(times) == 0:
+            return []
+
+        index = pd.DatetimeIndex(self.data.index)
+        max_gap = (index[1] - index[0]) * 2 if len(index) > 1 else pd.Timedelta(0)
+        breaks = np.diff(times.asi8) > pd.Timedelta(max_gap).value
+        starts = times[np.concatenate([[True], breaks])]
+        stops = times[np.concatenate([breaks, [True]])]
+        return list(zip(starts, stops))
+
+    def print_intervals(self):
+        for start, stop in self.intervals:
+            print "Anomalies between", start, " - ", stop
+
+    def plot(self, figsize=(20,10)):
+        """Draw the residual with the band and the data with the forecast,
+        anomalies are marked red."""
+        import matplotlib.pyplot as plt
+
+        times = self.anomaly_times
+        values = self.anomaly_values
+        x_points = self.forecast_std_dev.index.tolist()
+
+        plt.figure(figsize=figsize)
+        plt.plot(times, values, 'ro')
+        plot_trend_residual(list(x_points), self.lower.tolist(), self.upper.tolist(), color='b', alpha=0.2)
+        plt.plot(self.residual)
+        plt.show()
+
+        plt.figure(figsize=figsize)
+        yhat = self.forecast["yhat"]
+        plt.plot(times, values + yhat.reindex(times).values, 'ro')
+        upper = self.upper + yhat
+        lower = self.lower + yhat
+        plot_trend_residual(list(x_points), lower.tolist(), upper.tolist(), color='b', alpha=0.2)
+        plt.plot(self.data["y"], 'b')
+        plt.plot(yhat, 'orange')
+        plt.show()
+
+def plot_anom(data, forecast, forecast_std_dev, dev_multiplier=1.5, figsize=(20,10), window_delta=timedelta(hours = 4), percent_true=1, anomalies=None):
+    if anomalies is None:
+        residual = get_residual(data, forecast)
+        anomalies = get_anomalies(forecast_std_dev, residual, window_delta = window_delta, percent_true = percent_true)
+
+    result = AnomalyResult(data, forecast, forecast_std_dev, anomalies, dev_multiplier)
+    result.print_intervals()
+    result.plot(figsize)
+
+def fill_std_dev_forecast(forecast, forecast_std_dev):
+    """Align the std-dev forecast with the times of forecast. Times missing
+    from forecast are dropped, times missing from the std-dev forecast get the
+    last std-dev value before them (the first one if there is none) and no
+    other columns. forecast must be sorted by time."""
+    initial = forecast_std_dev["yhat"].values[0]
+    kept = forecast_std_dev[forecast_std_dev.index.isin(forecast.index)]
+
+    # Position of the last kept time up to every forecast time
+    present = forecast.index.isin(kept.index)
+    positions = np.where(present, np.arange(len(forecast.index)), -1)
+    last = np.maximum.accumulate(positions) if len(positions) else positions
+
+    filled = kept.reindex(forecast.index)
+    yhat = filled["yhat"].values
+    filled["yhat"] = np.where(last >= 0, yhat[np.maximum(last, 0)], initial)
+
+    filled.index.name = None
+    filled["ds"] = filled.index
+    return filled
+
+@contextmanager
+def stage(timings, name, message, verbose=True):
+    """Time a stage of calculate_anomalies into timings[name]."""
+    if verbose:
+        print message,
+    start = time.time()
+    yield
+    timings[name] = time.time() - start
+    if verbose:
+        print " Done in", timings[name], "s"
+
+def fit_forecasts(raw_data, filtered_data=[], periods=1, freq='H', std_dev_smoothing="1H", holidays=None, verbose=True, store=None, series=None, calendar=CALENDAR, timings=None):
+    """Fit the data and standard deviation models and forecast both for the
+    times of raw_data and periods * freq after. Returns the forecast and the
+    std-dev forecast aligned with it. The seconds spent in every stage are
+    added to timings."""
+    if timings is None:
+        timings = {}
+    if len(filtered_data) == 0:
+        if verbose:
+            print "No filtered data, using raw data"
+        filtered_data = raw_data
+
+    if holidays is None:
+        holidays = generate_holidays(raw_data, periods, freq, calendar)
+
+    with stage(timings, "data_model", "Building data model...", verbose):
+        model = fit_model(filtered_data, holidays, store, series, "data")
+
+    future = build_future(model, periods, freq)
+
+    with stage(timings, "forecast", "Forecasting data...", verbose):
+        forecast = get_prediction(model, future)
+
+    with stage(timings, "std_dev", "Getting standard deviation...", verbose):
+        std_devs = get_std_dev(filtered_data, delta=timedelta(hours=2))
+
+    std_devs = resample_std_dev(std_devs, std_dev_smoothing)
+
+    with stage(timings, "std_dev_model", "Building standard deviation model...", verbose):
+        model = fit_model(std_devs, holidays, store, series, "std_dev")
+
+    future = build_future(model, periods, freq)
+
+    with stage(timings, "std_dev_forecast", "Forecasting standard deviation...", verbose):
+        forecast_std_dev = get_prediction(model, future)
+
+    with stage(timings, "fill", "Filling points...", verbose):
+        forecast_std_dev = fill_std_dev_forecast(forecast, forecast_std_dev)
+
+    return forecast, forecast_std_dev
+
+def calculate_anomalies(raw_data, filtered_data=[], window_delta=timedelta(hours = 4), percent_true=1, std_dev_smoothing="1H", plot=True, holidays=None, verbose=True, store=None, series=None, calendar=CALENDAR):
+    """Fit the data and standard deviation models and find the anomalies in
+    raw_data. Returns an AnomalyResult, which is also printed and plotted if
+    plot is set. holidays defaults to the non-workdays of raw_data in
+    calendar. With a store the models of series are reused or warm-started,
+    see fit_model."""
+    start = time.time()
+    timings = {}
+    forecast, forecast_std_dev = fit_forecasts(raw_data, filtered_data, 1, 'H', std_dev_smoothing, holidays,
+                                               verbose, store, series, calendar, timings)
+
+    with stage(timings, "anomalies", "Finding anomalies...", verbose):
+        residual = get_residual(raw_data, forecast)
+        anomalies = get_anomalies(forecast_std_dev, residual, window_delta=window_delta, percent_true=percent_true)
+
+    timings["total"] = time.time() - start
+    result = AnomalyResult(raw_data[["y"]], forecast[["yhat", "yhat_lower", "yhat_upper"]],
+                           forecast_std_dev[["yhat"]], anomalies, timings=timings)
+
+    if plot:
+        result.print_intervals()
+        result.plot()
+
+    return result
+
+class AnomalyScorer:
+    """Scores new points against a stored forecast and std-dev band without
+    refitting. Points are compared with the forecast at their time or the last
+    one before it, the anomalies follow the rules of get_anomalies. The last
+    window_size - 1 scored points are kept, so windows reach back into earlier
+    calls and each call only needs the new points. Until window_size points
+    have been scored only the extreme anomalies are flagged, where
+    get_anomalies flags none. Build it with fit_scorer and refit on a
+    schedule, before expires."""
+
+    def __init__(self, times, yhat, band, window_size, dev_multiplier=1.5, percent_true=1):
+        self.times = np.asarray(times, dtype=np.int64)
+        self.yhat = np.asarray(yhat, dtype=np.float64)
+        self.band = np.asarray(band, dtype=np.float64)
+        self.window_size = int(window_size)
+        self.dev_multiplier = dev_multiplier
+        self.percent_true = percent_true
+        self.reset()
+
+    def reset(self):
+        """Forget the points kept from earlier calls of score."""
+        self.history_times = np.empty(0, dtype=np.int64)
+        self.history_residual = np.empty(0, dtype=np.float64)
+        self.history_band = np.empty(0, dtype=np.float64)
+
+    @classmethod
+    def from_forecasts(cls, forecast, forecast_std_dev, window_delta=timedelta(hours = 4), dev_multiplier=1.5, percent_true=1):
+        start = forecast_std_dev.index[0]
+        stop = start + window_delta
+        window_size = len(forecast_std_dev.loc[(forecast_std_dev.index >= start) & (forecast_std_dev.index <= stop)])
+        band = forecast_std_dev["yhat"].reindex(forecast.index).values
+        return cls(pd.DatetimeIndex(forecast.index).asi8, forecast["yhat"].values, band, window_size,
+                   dev_multiplier, percent_true)
+
+    @property
+    def expires(self):
+        """Time of the last forecast point."""
+        return pd.Timestamp(self.times[-1])
+
+    def is_stale(self, now=None, margin=timedelta(0)):
+        """True if the forecast ends within margin after now."""
+        if now is None:
+            now = pd.Timestamp.now()
+        return pd.Timestamp(now) + margin >= self.expires
+
+    def score(self, times, values):
+        """Score the points (times, values), sorted by time. Returns a dict
+        with the residuals, the band, the anomaly mask and the sorted
+        (time, residual) anomalies. Points outside the forecast get a NaN band
+        and are never anomalies. Windows also count the kept points before
+        times, kept points at or after the first of times are replaced."""
+        times = pd.DatetimeIndex(times)
+        positions = np.searchsorted(self.times, times.asi8, 'right') - 1
+        covered = (positions >= 0) & (times.asi8 <= self.times[-1])
+        positions = np.maximum(positions, 0)
+
+        residual = np.asarray(values, dtype=np.float64) - np.where(covered, self.yhat[positions], np.nan)
+        band = np.where(covered, self.band[positions], np.nan)
+
+        kept = self.history_times < times.asi8[0] if len(times) else np.ones(len(self.history_times), dtype=bool)
+        all_times = np.concatenate([self.history_times[kept], times.asi8])
+        all_residual = np.concatenate([self.history_residual[kept], residual])
+        all_band = np.concatenate([self.history_band[kept], band])
+        if len(all_times) < self.window_size:
+            # No full window yet, only the extreme anomalies can be told apart
+            with np.errstate(invalid='ignore'):
+                mask = np.abs(all_residual) > all_band * self.dev_multiplier * 4
+        else:
+            mask = anomaly_mask(all_residual, all_band, self.window_size, self.dev_multiplier,
+                                self.percent_true)
+        mask = mask[len(all_times) - len(times):]
+
+        history = max(len(all_times) - self.window_size + 1, 0)
+        self.history_times = all_times[history:]
+        self.history_residual = all_residual[history:]
+        self.history_band = all_band[history:]
+
+        return {
+            "residual": residual,
+            "band": band,
+            "mask": mask,
+            "anomalies": sorted(zip(times[mask], residual[mask])),
+        }
+
+    def save(self, path):
+        with open(path, "wb") as file_handle:
+            np.savez(file_handle, times=self.times, yhat=self.yhat, band=self.band,
+                     settings=np.array([self.window_size, self.dev_multiplier, self.percent_true]))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as stored:
+            window_size, dev_multiplier, percent_true = stored["settings"]
+            return cls(stored["times"], stored["yhat"], stored["band"], window_size, dev_multiplier, percent_true)
+
+def fit_scorer(raw_data, filtered_data=[], horizon=timedelta(days=1), window_delta=timedelta(hours = 4), percent_true=1, std_dev_smoothing="1H", verbose=True, store=None, series=None, calendar=CALENDAR):
+    """Fit both models on raw_data and return an AnomalyScorer forecasting
+    horizon past it at the step of raw_data."""
+    times = pd.DatetimeIndex(raw_data["ds"])
+    step = pd.Timedelta(np.median(np.diff(times.asi8)))
+    periods = int(math.ceil(pd.Timedelta(horizon) / step))
+    holidays = generate_holidays(pd.DataFrame(index=[times[0], times[-1] + pd.Timedelta(horizon)]), 1, 'D', calendar)
+    forecast, forecast_std_dev = fit_forecasts(raw_data, filtered_data, periods, to_offset(step), std_dev_smoothing,
+                                               holidays, verbose, store, series, calendar)
+    return AnomalyScorer.from_forecasts(forecast, forecast_std_dev, window_delta, percent_true=percent_true)
+
+# Series of calculate_anomalies_multiple, set before the workers are forked so
+# they share them instead of receiving a pickled copy per task
+_shared_series = {}
+
+def _init_worker(memory_limit):
+    """Cap the address space of a worker process at memory_limit MB."""
+    if memory_limit:
+        limit = int(memory_limit * 1024 * 1024)
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+def _calculate_shared(i):
+    """Run calculate_anomalies on the i:th shared series in a worker."""
+    kwargs = _shared_series["kwargs"]
+    names = _shared_series["names"]
+    try:
+        return calculate_anomalies(_shared_series["raw_datas"][i], _shared_series["filtered_datas"][i],
+                                   series=names[i] if names else None, **kwargs)
+    except (MemoryError, RuntimeError, ValueError) as error:
+        return AnomalyResult.failed("{}: {}".format(type(error).__name__, error))
+
+def calculate_anomalies_multiple(raw_datas, filtered_datas=[], window_delta=timedelta(hours = 4), percent_true=1, std_dev_smoothing="1H", workers=1, memory_limit=None, plot=None, store=None, names=None, calendar=CALENDAR):
+    """Run calculate_anomalies on every series and return their results in
+    order. With more than one worker the series are spread over a pool of
+    processes, each limited to memory_limit MB if set, and nothing is plotted
+    unless plot is set. A series that fails in a worker gets a result with an
+    error instead of anomalies. Models are only kept in store for series
+    named in names."""
+    if len(filtered_datas) == 0:
+        filtered_datas = raw_datas
+
+    raw_datas_len = len(raw_datas)
+    filtered_dats_len = len(filtered_datas)
+
+    if raw_datas_len != filtered_dats_len:
+        print "Error: Length of raw_datas and filtered_dats are different!!"
+        return
+
+    if plot is None:
+        plot = workers <= 1
+
+    reserve_weekend_hour_cache(FRAMES_PER_SERIES * raw_datas_len)
+
+    # One holiday table covering all series is shared by all models
+    periods = 1
+    freq = 'H'
+    start = min(raw_data.index[0] for raw_data in raw_datas)
+    stop = max(raw_data.index[-1] for raw_data in raw_datas)
+    holidays = generate_holidays(pd.DataFrame(index=[start, stop]), periods, freq, calendar)
+
+    kwargs = {
+        "window_delta": window_delta,
+        "percent_true": percent_true,
+        "std_dev_smoothing": std_dev_smoothing,
+        "holidays": holidays,
+        "plot": plot,
+        "store": store,
+    }
+
+    if workers <= 1:
+        results = []
+        for i in range(raw_datas_len):
+            print "Calculating data", i + 1, "of", raw_datas_len, "..."
+            start = time.time()
+            results.append(calculate_anomalies(raw_datas[i], filtered_datas[i],
+                                               series=names[i] if names else None, **kwargs))
+            elapsed = time.time()
+            elapsed = elapsed - start
+            print "Done in", elapsed, "s"
+        return results
+
+    # Encode the regressors of all frames once before forking, series with
+    # the same times share them
+    for filtered_data in filtered_datas:
+        std_devs = resample_std_dev(get_std_dev(filtered_data, delta=timedelta(hours=2)), std_dev_smoothing)
+        for ds in (filtered_data["ds"], std_devs["ds"]):
+            weekend_hour_regressors(ds)
+            weekend_hour_regressors(future_dates(ds, periods, freq))
+
+    kwargs["verbose"] = False
+    _shared_series.update(raw_datas=raw_datas, filtered_datas=filtered_datas, names=names, kwargs=kwargs)
+    pool = multiprocessing.Pool(min(workers, raw_datas_len), _init_worker, (memory_limit,))
+    try:
+        print "Calculating", raw_datas_len, "series on", min(workers, raw_datas_len), "workers..."
+        start = time.time()
+        results = pool.map(_calculate_shared, range(raw_datas_len), chunksize=1)
+        print "Done in", time.time() - start, "s"
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+        _shared_series.clear()
+
+    return results
+
+if __name__ == '__main__':
+    print "Prophet anomaly detector loaded"
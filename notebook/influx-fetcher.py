@@ -1 +1 @@
-../influx-fetcher/influx-fetcher.py
\ No newline at end of file
+../kube_learn/influx_fetcher.py
\ No newline at end of file
@@ -0,0 +1,18 @@
+from setuptools import setup
+
+setup(
+    name="kube-learn",
+    version="0.1.0",
+    description="Fetching and anomaly detection for Kubernetes cluster metrics",
+    packages=["kube_learn"],
+    install_requires=["numpy", "requests"],
+    extras_require={
+        "kairos": ["pyKairosDB", "requests"],
+        "luminol": ["luminol", "pandas", "scikit-learn", "matplotlib"],
+        "prophet": ["fbprophet", "workalendar", "pandas", "matplotlib"],
+        "kmeans": ["scikit-learn", "matplotlib"],
+    },
+    entry_points={
+        "console_scripts": ["kube-learn=kube_learn.cli:main"],
+    },
+)